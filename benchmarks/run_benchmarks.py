@@ -0,0 +1,310 @@
+"""
+Benchmarks of the hot paths in all projects.
+
+Every benchmark uses a fixed seed and a parameter preset, and reports the wall time, the peak memory
+and the number of evaluations of the functions doing the work, so runs can be compared with each other.
+
+Usage:
+    python benchmarks/run_benchmarks.py                          # quick preset, JSON to stdout
+    python benchmarks/run_benchmarks.py --preset full --output baseline.json
+    python benchmarks/run_benchmarks.py --compare baseline.json  # ratios against an earlier run
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+
+import matplotlib
+matplotlib.use('Agg')   # The models import pyplot, but nothing is shown
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Parameter presets: the sizes each benchmark is run at
+PRESETS = {
+    'quick': SimpleNamespace(repeat=3, K=[100, 1000], n=[50, 500], horizons=[100, 1000]),
+    'full': SimpleNamespace(repeat=5, K=[100, 1000, 10000], n=[50, 500, 5000], horizons=[100, 1000, 10000]),
+}
+SEED = 2024
+
+
+def selected(preset, name):
+    """Whether the benchmark called name is run (its name contains the --filter string)"""
+    return preset.filter in name
+
+
+def load_project(subdir, *modules):
+    """
+    Import the modules of one project
+
+    The projects import their own modules by name (Problem1 and Problem2 both have a Model and a Funcs module),
+    so each project is imported with only its own directory on the path and removed from sys.modules afterwards.
+
+    Args:
+        subdir: Directory of the project relative to the repository
+        *modules: Names of the modules to import
+
+    Returns:
+        project: Namespace with the imported modules
+    """
+    path = os.path.join(ROOT, subdir)
+    names = set(modules) | {'Model', 'Funcs'}
+    for name in names:
+        sys.modules.pop(name, None)
+
+    sys.path.insert(0, path)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            project = SimpleNamespace(**{name: importlib.import_module(name) for name in modules})
+    finally:
+        sys.path.remove(path)
+        for name in names:
+            sys.modules.pop(name, None)
+
+    return project
+
+
+class Counter:
+    """Count the calls of functions, by temporarily replacing them on a module or an object"""
+
+    def __init__(self):
+        self.counts = {}
+
+    @contextlib.contextmanager
+    def patch(self, owner, name, label = None):
+        label = label or name
+        original = getattr(owner, name)
+        self.counts.setdefault(label, 0)
+
+        def wrapper(*args, **kwargs):
+            self.counts[label] += 1
+            return original(*args, **kwargs)
+
+        setattr(owner, name, wrapper)
+        try:
+            yield
+        finally:
+            setattr(owner, name, original)
+
+
+def measure(name, params, run, repeat, counted = ()):
+    """
+    Time one benchmark
+
+    The first call is made under tracemalloc to find the peak memory and count the evaluations,
+    the following calls are timed without tracing.
+
+    Args:
+        name: Name of the benchmark
+        params: Dictionary describing the parameters of the benchmark
+        run: Function without arguments running the benchmark, may return a dictionary of extra counts (other return values are ignored)
+        repeat: Number of timed calls
+        counted: List of (owner, attribute) pairs whose calls are counted
+
+    Returns:
+        result: Dictionary with the timings, the peak memory and the evaluation counts
+    """
+    counter = Counter()
+
+    # 1. One traced call for the memory and the counts
+    with contextlib.ExitStack() as stack:
+        for owner, attribute in counted:
+            stack.enter_context(counter.patch(owner, attribute))
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            extra = run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    # 2. Timed calls
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+
+    return {
+        'name': name,
+        'params': params,
+        'repeat': repeat,
+        'wall_time_s': float(np.median(times)),
+        'wall_time_min_s': float(np.min(times)),
+        'peak_memory_bytes': int(peak),
+        'evaluations': {**counter.counts, **(extra if isinstance(extra, dict) else {})},
+    }
+
+
+def bench_inaugural(preset):
+    """ExchangeEconomyClass.find_equilibrium"""
+    project = load_project('inauguralproject', 'inauguralproject')
+    model = project.inauguralproject.ExchangeEconomyClass()
+
+    def run():
+        model.find_equilibrium(1.5, 1)
+
+    if selected(preset, 'inaugural.find_equilibrium'):
+        yield measure('inaugural.find_equilibrium', {'p1_guess': 1.5}, run, preset.repeat, [(model, 'excess_demand_good_1_func')])
+
+
+def bench_problem1(preset):
+    """Walras' law solved with fsolve, the labor supply and the global search for the optimal policy"""
+    project = load_project('examproject/Problem1', 'Model', 'Funcs')   # Model first, as Funcs and Model import each other
+    Funcs = project.Funcs
+    from scipy import optimize
+    par = project.Model.production_economy().par
+
+    def solve():
+        x, info, ier, msg = optimize.fsolve(Funcs.Walras_law, [par.p1, par.p2], args=(par.tau, par.T, par), full_output=True)
+        return {'fsolve_nfev': int(info['nfev'])}
+
+    if selected(preset, 'problem1.walras_fsolve'):
+        yield measure('problem1.walras_fsolve', {'tau': par.tau, 'T': par.T}, solve, preset.repeat, [(Funcs, 'labor_supply'), (Funcs, 'utility')])
+
+    def supply():
+        Funcs.labor_supply(par, 1.0, 1.0, par.tau, par.T)
+
+    if selected(preset, 'problem1.labor_supply'):
+        yield measure('problem1.labor_supply', {'p1': 1.0, 'p2': 1.0}, supply, preset.repeat, [(Funcs, 'utility')])
+
+    model = project.Model.production_economy()
+
+    def policy():
+        return {'refinement_nfev': int(sum(res.nfev for res in model.optimal_policy(workers=1).refinements))}
+
+    if selected(preset, 'problem1.optimal_policy'):
+        yield measure('problem1.optimal_policy', {'grid': '151x151', 'candidates': 4}, policy, preset.repeat)
+
+
+def bench_problem2(preset):
+    """friend_utility, analyze, switch and the multi-round learning dynamics at several K"""
+    project = load_project('examproject/Problem2', 'Funcs', 'Model')
+    Funcs = project.Funcs
+
+    for K in preset.K:
+        par = project.Model.graduate_model().par
+        par.K = K
+        params = {'N': par.N, 'K': K, 'J': par.J}
+
+        if selected(preset, 'problem2.friend_utility'):
+            yield measure('problem2.friend_utility', params, lambda: Funcs.friend_utility(par), preset.repeat, [(Funcs.np.random, 'normal')])
+
+        # The inputs of analyze and switch are only simulated if one of them is run
+        if selected(preset, 'problem2.analyze') or selected(preset, 'problem2.switch'):
+            _, expected_utility, career_choice, actual_utility = Funcs.friend_utility(par)
+        if selected(preset, 'problem2.analyze'):
+            yield measure('problem2.analyze', params, lambda: Funcs.analyze(par, career_choice, expected_utility, actual_utility), preset.repeat)
+        if selected(preset, 'problem2.switch'):
+            yield measure('problem2.switch', params, lambda: Funcs.switch(par, career_choice, expected_utility, actual_utility), preset.repeat)
+        if selected(preset, 'problem2.learning_dynamics'):
+            yield measure('problem2.learning_dynamics', {**params, 'rounds': 20, 'signals': 1}, lambda: Funcs.learning_dynamics(par, rounds=20, signals=1, seed=SEED), preset.repeat)
+
+
+def bench_problem3(preset):
+    """find_points and algorithm1 at several n, and the batched interpolation in 3-D"""
+    project = load_project('examproject/Problem3', 'Funcs')
+    Funcs = project.Funcs
+
+    for n in preset.n:
+        rng = np.random.default_rng(SEED)
+        X = rng.uniform(size=(n, 2))
+        y = rng.uniform(size=(2,))
+
+        if selected(preset, 'problem3.find_points'):
+            yield measure('problem3.find_points', {'n': n}, lambda: Funcs.find_points(X, y), preset.repeat)
+        if selected(preset, 'problem3.algorithm1'):
+            yield measure('problem3.algorithm1', {'n': n}, lambda: Funcs.algorithm1(X, y), preset.repeat, [(Funcs, 'f')])
+
+        X3 = rng.uniform(size=(10*n, 3))
+        Y3 = rng.uniform(0.2, 0.8, size=(n, 3))
+        if selected(preset, 'problem3.interpolate'):
+            yield measure('problem3.interpolate', {'n': 10*n, 'm': n, 'd': 3}, lambda: Funcs.interpolate(X3, Funcs.f(X3), Y3), preset.repeat)
+
+
+def bench_solow(preset):
+    """Solow.solve_ss, the simulation in Solow.graph at several horizons and the long-horizon simulation"""
+    project = load_project('modelproject', 'modelproject')
+    model = project.modelproject.Solow()
+    model.setup()
+
+    def solve():
+        return {'function_calls': int(model.solve_ss(method='brentq', ext2=True).function_calls)}
+
+    if selected(preset, 'solow.solve_ss'):
+        yield measure('solow.solve_ss', {'method': 'brentq', 'ext2': True}, solve, preset.repeat)
+
+    for T in preset.horizons:
+        if selected(preset, 'solow.graph'):
+            yield measure('solow.graph', {'periods': T, 'ext2': True}, lambda: model.graph(periods=T, ext2=True), preset.repeat)
+
+    def long_horizon():
+        for block in model.simulate_blocks(periods=10**6, ext2=True):
+            pass
+
+    if selected(preset, 'solow.simulate_blocks'):
+        yield measure('solow.simulate_blocks', {'periods': 10**6, 'ext2': True}, long_horizon, preset.repeat)
+
+
+BENCHMARKS = [bench_inaugural, bench_problem1, bench_problem2, bench_problem3, bench_solow]
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='quick')
+    parser.add_argument('--repeat', type=int, help='number of timed calls (overrides the preset)')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this string')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--compare', help='JSON report of an earlier run to compare the wall times with')
+    args = parser.parse_args(argv)
+
+    preset = SimpleNamespace(**vars(PRESETS[args.preset]), filter=args.filter)
+    if args.repeat is not None:
+        preset.repeat = args.repeat
+
+    results = []
+    for bench in BENCHMARKS:
+        for result in bench(preset):    # Only the benchmarks matching --filter are measured (see selected)
+            results.append(result)
+            print(f"{result['name']:28s} {json.dumps(result['params']):40s} {result['wall_time_s']:10.5f} s", file=sys.stderr)
+
+    report = {
+        'meta': {
+            'preset': args.preset,
+            'seed': SEED,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+    # Compare with an earlier run, matching benchmarks on name and parameters
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = {(r['name'], json.dumps(r['params'], sort_keys=True)): r for r in json.load(file)['results']}
+        for result in results:
+            old = baseline.get((result['name'], json.dumps(result['params'], sort_keys=True)))
+            if old is not None:
+                result['speedup'] = old['wall_time_s']/result['wall_time_s']
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+"""Code shared by the projects (the project folders are not packages, so add the repository to the path to use it)."""
+
+from .instrumentation import SolverStats
+from .params import Params
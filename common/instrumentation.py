@@ -0,0 +1,116 @@
+"""
+Opt-in instrumentation of the solvers in the projects.
+
+The models do not import this module. They accept any object with the three methods of SolverStats,
+
+    stats.count(name, n = 1)        # add n evaluations to a counter
+    stats.record(name, seconds)     # add the time of a solver call timed by the model
+    stats.timer(name)               # context manager timing a (possibly nested) solver call
+
+and only call them when a stats object has been attached (model.instrument(stats)), so nothing is
+recorded, and almost nothing is spent, when instrumentation is disabled. The stats object belongs to
+one model: the functions a model calls get it as an argument, so other models are not recorded.
+Work run in other processes (the restarts of Solow.calibrate and the refinements of
+production_economy.optimal_policy) does not report to it; only the totals the model records after
+collecting the results (wall time and evaluation counts) are included.
+"""
+
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class SolverStats:
+    """Counts of evaluations and timings of solver calls"""
+
+    def __init__(self, callback = None):
+        """
+        Initialize empty statistics
+
+        Args:
+            callback: Optional function called with a dictionary (event, name, value) for every count and finished timer
+        """
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        """Remove all counts and timings"""
+        self.counts = defaultdict(int)
+        self.calls = defaultdict(int)
+        self.total_time = defaultdict(float)
+        self.max_time = defaultdict(float)
+        self._stack = []
+
+    def count(self, name, n = 1):
+        """
+        Add evaluations to a counter
+
+        Args:
+            name: Name of the counter, e.g. 'labor_supply.nfev'
+            n: Number of evaluations
+        """
+        self.counts[name] += int(n)
+        if self.callback is not None:
+            self.callback({'event': 'count', 'name': name, 'value': int(n)})
+
+    def record(self, name, seconds):
+        """
+        Add the time of a solver call timed by the caller
+
+        Args:
+            name: Name of the solver call (recorded under the path of the enclosing timers)
+            seconds: Time spent in the call
+        """
+        path = '/'.join(self._stack + [name])
+        self.calls[path] += 1
+        self.total_time[path] += seconds
+        self.max_time[path] = max(self.max_time[path], seconds)
+        if self.callback is not None:
+            self.callback({'event': 'time', 'name': path, 'value': seconds})
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Time a solver call
+
+        Timers can be nested, and a nested timer is recorded under the path of the enclosing timers,
+        e.g. 'solve_equilibrium/labor_supply.minimize'.
+
+        Args:
+            name: Name of the solver call
+        """
+        start = time.perf_counter()
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            self.record(name, time.perf_counter() - start)
+
+    def as_dict(self):
+        """
+        Statistics as a dictionary (e.g. for json)
+
+        Returns:
+            stats: Dictionary with the counts and, for each timer, the number of calls and the total and maximum time
+        """
+        return {
+            'counts': dict(self.counts),
+            'timers': {path: {'calls': self.calls[path], 'total_s': self.total_time[path], 'max_s': self.max_time[path]} for path in self.calls},
+        }
+
+    def report(self):
+        """
+        Statistics as a table
+
+        Returns:
+            text: The counts and timings, one per line
+        """
+        lines = ['Timers:']
+        for path in sorted(self.calls):
+            lines.append(f'  {path:50s} {self.calls[path]:8d} calls {self.total_time[path]:12.6f} s')
+        lines.append('Counts:')
+        for name in sorted(self.counts):
+            lines.append(f'  {name:50s} {self.counts[name]:8d}')
+
+        return '\n'.join(lines)
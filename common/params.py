@@ -0,0 +1,171 @@
+"""
+Compact parameter containers for the models.
+
+A model declares its parameters as the slots of a subclass of Params,
+
+    class SolowParams(Params):
+        __slots__ = ('alpha', 'kappa', ...)
+
+and assigns them in setup() as it would on a SimpleNamespace. Unlike a SimpleNamespace, the parameters
+have no instance dictionary (smaller pickles, faster lookups), can be frozen, have a content fingerprint
+that is stable across processes, and can be copied with overrides or broadcast to arrays for the
+vectorized solvers.
+"""
+
+import hashlib
+
+import numpy as np
+
+
+class Params:
+    """Slotted, optionally frozen parameters"""
+
+    __slots__ = ('_frozen', '_fingerprint')
+
+    def __init__(self, **values):
+        """
+        Initialize the parameters
+
+        Args:
+            **values: Initial values of the parameters (parameters not given are unset until assigned)
+        """
+        object.__setattr__(self, '_frozen', False)
+        object.__setattr__(self, '_fingerprint', None)
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def fields(cls):
+        """Names of the parameters, in the order they are declared"""
+        names = []
+        for klass in reversed(cls.__mro__):
+            for name in klass.__dict__.get('__slots__', ()):
+                if not name.startswith('_') and name not in names:
+                    names.append(name)
+        return tuple(names)
+
+    def __setattr__(self, name, value):
+        if self._frozen:
+            raise AttributeError(f'{type(self).__name__} is frozen, use replace() to change {name}')
+        if name.startswith('_'):
+            raise AttributeError(f'{type(self).__name__} has no parameter {name}')
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        if self._frozen:
+            raise AttributeError(f'{type(self).__name__} is frozen')
+        object.__delattr__(self, name)
+
+    def freeze(self):
+        """Make the parameters read-only (returns the parameters themselves)"""
+        object.__setattr__(self, '_frozen', True)
+        return self
+
+    @property
+    def frozen(self):
+        return self._frozen
+
+    def as_dict(self):
+        """Dictionary of the parameters that are set"""
+        return {name: getattr(self, name) for name in self.fields() if hasattr(self, name)}
+
+    def replace(self, **overrides):
+        """
+        Copy the parameters with some of them changed
+
+        Args:
+            **overrides: New values of parameters
+
+        Returns:
+            par: New parameters of the same class, frozen if these are frozen
+        """
+        for name in overrides:
+            if name not in self.fields():
+                raise ValueError(f'Unknown parameter: {name}')
+
+        par = type(self)(**{**self.as_dict(), **overrides})
+        return par.freeze() if self._frozen else par
+
+    def copy(self):
+        """Unfrozen copy of the parameters"""
+        return type(self)(**self.as_dict())
+
+    def fingerprint(self):
+        """
+        Hash of the contents of the parameters
+
+        Numbers are hashed by their value as floats (so 1 and 1.0 are the same) and arrays by their
+        dtype, shape and bytes, so the fingerprint is the same across processes and sessions.
+        The fingerprint is computed once when the parameters are frozen.
+
+        Returns:
+            fingerprint: sha1 hex digest
+        """
+        if self._fingerprint is not None:
+            return self._fingerprint
+
+        h = hashlib.sha1(type(self).__name__.encode())
+        for name, value in self.as_dict().items():
+            h.update(name.encode())
+            if isinstance(value, (bool, int, float, np.number)) and not isinstance(value, np.ndarray):
+                h.update(repr(float(value)).encode())
+            elif isinstance(value, np.ndarray):
+                h.update(f'{value.dtype.str}{value.shape}'.encode())
+                h.update(np.ascontiguousarray(value).tobytes())
+            else:
+                h.update(repr(value).encode())
+        digest = h.hexdigest()
+
+        if self._frozen:
+            object.__setattr__(self, '_fingerprint', digest)
+        return digest
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.fingerprint() == other.fingerprint()
+
+    def __hash__(self):
+        if not self._frozen:
+            raise TypeError(f'unhashable type: {type(self).__name__} (freeze() it first)')
+        return hash(self.fingerprint())
+
+    def as_arrays(self, names = None, **overrides):
+        """
+        Broadcast parameters to 1-D float arrays with a common length
+
+        Args:
+            names: Parameters to broadcast (all parameters with scalar values if None)
+            **overrides: Parameters to override, scalars or arrays, broadcast against each other
+
+        Returns:
+            par: Unfrozen parameters of the same class, where the parameters in names are arrays of length P
+                (the number of parameter sets) and the others are unchanged
+        """
+        values = self.as_dict()
+        if names is None:
+            names = [name for name, value in values.items() if np.ndim(value) == 0]
+        for name in overrides:
+            if name not in names:
+                raise ValueError(f'Unknown parameter: {name}')
+
+        arrays = np.broadcast_arrays(*[np.asarray(overrides.get(name, values.get(name)), dtype=float) for name in names])
+        values.update({name: np.atleast_1d(array).ravel() for name, array in zip(names, arrays)})
+
+        return type(self)(**values)
+
+    def __getstate__(self):
+        # Only the values, in the order of the fields (None for parameters that are not set)
+        return tuple(getattr(self, name, None) for name in self.fields()), self._frozen
+
+    def __setstate__(self, state):
+        values, frozen = state
+        object.__setattr__(self, '_fingerprint', None)
+        for name, value in zip(self.fields(), values):
+            if value is not None:
+                object.__setattr__(self, name, value)
+        object.__setattr__(self, '_frozen', frozen)
+
+    def __repr__(self):
+        items = ', '.join(f'{name}={value!r}' for name, value in self.as_dict().items())
+        return f'{type(self).__name__}({items})'
@@ -1,16 +1,575 @@
-def keep_regs(df, regs):
+import hashlib
+import json
+import os
+import re
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401 (only used through pandas' parquet support)
+    _PARQUET = True
+except ImportError:
+    _PARQUET = False
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+CACHE_VERSION = 1   # Bump when the cleaning below changes, so old caches are rebuilt
+
+
+def keep_regs(df, regs, exact = False, return_mask = False):
     """ Example function. Keep only the subset regs of regions in data.
 
+    All regions are matched in a single pass, either with one compiled alternation of the
+    patterns in regs or, if exact is True, with set membership on the region names.
+
     Args:
-        df (pd.DataFrame): pandas dataframe 
+        df (pd.DataFrame): pandas dataframe
+        regs (list): regions (regular expressions unless exact is True) to remove
+        exact (bool): if True, only remove rows whose region equals one of regs (and rows with a missing region, in both modes)
+        return_mask (bool): if True, return the boolean mask of rows to keep instead of the filtered dataframe
 
     Returns:
-        df (pd.DataFrame): pandas dataframe
+        df (pd.DataFrame): pandas dataframe (or the boolean mask if return_mask is True)
+
+    """
+
+    regs = list(regs)
+
+    if len(regs) == 0:
+        I = df.reg.isin([])
+    elif exact:
+        I = df.reg.isin(regs) | df.reg.isna() # rows with a missing region are dropped, as by the regular expressions
+    else:
+        pattern = re.compile('|'.join(f'(?:{r})' for r in regs))
+        I = df.reg.str.contains(pattern, na=True) # missing regions count as matches, whatever the string dtype
+
+    keep = I.eq(False) # keep everything else
+
+    if return_mask:
+        return keep
+
+    return df.loc[keep]
+
+
+def _file_hash(path):
+    """ Hash the contents of a file.
+
+    Args:
+        path (str): path to the file
+
+    Returns:
+        digest (str): sha1 hex digest of the file
+
+    """
+
+    h = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def _cached(path, name, build, cache = True, cache_dir = None):
+    """ Load a cleaned table from the cache, building and storing it if the source file has changed.
+
+    The table is stored as parquet (or as a pickle if pyarrow is not installed) next to a small json file
+    with the modification time, size and hash of the source file. The hash is only recomputed when the
+    modification time or the size differ.
+
+    Args:
+        path (str): path to the source file
+        name (str): name of the cache entry
+        build (callable): function of path returning the cleaned pd.DataFrame
+        cache (bool): if False, always build the table and do not touch the cache
+        cache_dir (str): directory of the cache, defaults to __datacache__ next to the source file
+
+    Returns:
+        df (pd.DataFrame): the cleaned table
+
+    """
+
+    if not cache:
+        return build(path)
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), '__datacache__')
+    data_path = os.path.join(cache_dir, f'{name}.parquet' if _PARQUET else f'{name}.pkl')
+    meta_path = os.path.join(cache_dir, f'{name}.json')
+
+    stat = os.stat(path)
+    source = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'version': CACHE_VERSION}
+
+    # 1. check the cache
+    try:
+        with open(meta_path) as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        meta = {}
+
+    fresh = os.path.exists(data_path) and meta.get('version') == CACHE_VERSION
+    if fresh and (meta.get('mtime_ns'), meta.get('size')) != (source['mtime_ns'], source['size']):
+        source['sha1'] = _file_hash(path)
+        fresh = meta.get('sha1') == source['sha1'] # touched but unchanged files are still fresh
+
+    if fresh:
+        df = pd.read_parquet(data_path) if _PARQUET else pd.read_pickle(data_path)
+        if 'sha1' in source: # store the new modification time to skip hashing next time
+            _write_meta(meta_path, source)
+        return df
+
+    # 2. build and store
+    df = build(path)
+    source.setdefault('sha1', _file_hash(path))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f'{data_path}.{os.getpid()}.tmp'
+        if _PARQUET:
+            df.to_parquet(tmp)
+        else:
+            df.to_pickle(tmp)
+        os.replace(tmp, data_path)
+        _write_meta(meta_path, source)
+    except OSError:
+        pass # the cache is an optimization, so a read-only location is not an error
+
+    return df
+
+
+def _write_meta(meta_path, source):
+    """ Write the json file describing the source of a cache entry. """
+
+    tmp = f'{meta_path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as file:
+        json.dump(source, file)
+    os.replace(tmp, meta_path)
+
+
+def _header_lines(path):
+    """ Count the title lines before the Year,Jan,... header of a GISTEMP-style file.
+
+    Args:
+        path (str): path to the csv file
+
+    Returns:
+        skip (int): number of lines to skip
+
+    """
+
+    with open(path) as file:
+        for skip, line in enumerate(file):
+            if line.startswith('Year'):
+                return skip
+
+    raise ValueError(f'No Year header found in {path}')
+
+
+def read_temperature(path, chunksize = None):
+    """ Read a GISTEMP-style file of monthly temperatures.
+
+    The title line is skipped, only Year and the monthly columns are parsed, and the *** sentinel
+    is turned into NaN while parsing, so the columns come out numeric without a conversion pass.
+
+    Args:
+        path (str): path to the csv file
+        chunksize (int): if given, return an iterator over chunks of this many rows
+
+    Returns:
+        df (pd.DataFrame): Year and the monthly temperatures (or an iterator of such chunks)
+
+    """
+
+    dtypes = {'Year': 'int64'}
+    dtypes.update({month: 'float64' for month in MONTHS})
+
+    return pd.read_csv(path, skiprows=_header_lines(path), usecols=['Year'] + MONTHS, na_values=['***'], dtype=dtypes, chunksize=chunksize)
+
+
+def stream_temperature_means(path, chunksize = 1_000_000):
+    """ Monthly and annual mean temperatures of a (possibly very large) GISTEMP-style file.
+
+    The file is read in chunks and only running sums and counts are kept, so memory is bounded by the
+    chunk size and the number of distinct years. Rows with the same Year (e.g. different stations) are pooled.
+
+    Args:
+        path (str): path to the csv file
+        chunksize (int): number of rows read at a time
+
+    Returns:
+        monthly (pd.DataFrame): Mean and number of observations N for each month
+        annual (pd.DataFrame): Mean and number of monthly observations N for each Year
+
+    """
+
+    month_sum = np.zeros(len(MONTHS))
+    month_n = np.zeros(len(MONTHS), dtype=np.int64)
+    year_sum = pd.Series(dtype='float64')
+    year_n = pd.Series(dtype='int64')
+
+    for chunk in read_temperature(path, chunksize=chunksize):
+        values = chunk[MONTHS].to_numpy()
+        observed = ~np.isnan(values)
+
+        # a. monthly sums over all rows
+        month_sum += np.where(observed, values, 0).sum(axis=0)
+        month_n += observed.sum(axis=0)
+
+        # b. annual sums over all months and rows of the year
+        by_year = pd.DataFrame({'Year': chunk.Year.to_numpy(), 'sum': np.nansum(values, axis=1), 'n': observed.sum(axis=1)}).groupby('Year').sum()
+        year_sum = year_sum.add(by_year['sum'], fill_value=0)
+        year_n = year_n.add(by_year['n'], fill_value=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        monthly = pd.DataFrame({'Mean': month_sum/month_n, 'N': month_n}, index=pd.Index(MONTHS, name='Month'))
+        annual = pd.DataFrame({'Mean': year_sum/year_n, 'N': year_n.astype('int64')})
+    annual.index = annual.index.astype('int64')
+    annual.index.name = 'Year'
+
+    return monthly, annual.sort_index()
+
+
+def _build_temperature(path):
+    """ Parse and clean the GISTEMP global means (GlobalTemp.csv).
+
+    Args:
+        path (str): path to the csv file
+
+    Returns:
+        df (pd.DataFrame): Year, the monthly temperatures and their Mean, for years with all months observed
+
+    """
+
+    # a. parse only the monthly columns with *** as NaN (see read_temperature)
+    df = read_temperature(path)
+
+    # b. remove years with a limited number of observations
+    df = df.loc[df[MONTHS].notna().all(axis=1)].reset_index(drop=True)
+
+    # c. annual average temperature
+    df['Mean'] = df[MONTHS].mean(axis=1)
+
+    return df
+
+
+def load_temperature(path = 'GlobalTemp.csv', cache = True, cache_dir = None):
+    """ Load the cleaned global temperature data.
+
+    Args:
+        path (str): path to GlobalTemp.csv
+        cache (bool): if True, use the binary cache (see _cached)
+        cache_dir (str): directory of the cache
+
+    Returns:
+        df (pd.DataFrame): Year, the monthly temperatures and their Mean
+
+    """
+
+    return _cached(path, 'temperature', _build_temperature, cache, cache_dir)
+
+
+def _build_gdp(path, country = 'World'):
+    """ Parse and clean the World Bank GDP sheet (GDP.xls) for one country.
+
+    Args:
+        path (str): path to the xls file
+        country (str): country name to keep
+
+    Returns:
+        df (pd.DataFrame): GDP and Year for the years with data
+
+    """
+
+    df = pd.read_excel(path, skiprows=3) # the first 3 rows are a title
+
+    # a. remove space in column names
+    df = df.rename(columns=lambda x: x.replace(' ', '_'))
+
+    # b. select the country and keep only years
+    df = df.loc[df.Country_Name == country]
+    df = df.drop(columns=['Country_Name', 'Country_Code', 'Indicator_Name', 'Indicator_Code'])
+
+    # c. transpose to one row per year
+    df = pd.DataFrame({'GDP': df.iloc[0].to_numpy(dtype=float), 'Year': df.columns.astype(int)})
+
+    # d. remove years without data
+    df = df.loc[df.GDP >= 0].reset_index(drop=True)
+
+    return df
+
+
+def load_gdp(path = 'GDP.xls', country = 'World', cache = True, cache_dir = None):
+    """ Load the cleaned GDP series for one country.
+
+    Args:
+        path (str): path to GDP.xls
+        country (str): country name to keep
+        cache (bool): if True, use the binary cache (see _cached)
+        cache_dir (str): directory of the cache
+
+    Returns:
+        df (pd.DataFrame): GDP and Year
+
+    """
+
+    name = 'gdp-' + re.sub(r'\W+', '_', country)
+
+    return _cached(path, name, lambda p: _build_gdp(p, country), cache, cache_dir)
+
+
+def _build_gdp_panel(path):
+    """ Parse the full World Bank GDP sheet (GDP.xls) into a long panel.
+
+    Args:
+        path (str): path to the xls file
+
+    Returns:
+        df (pd.DataFrame): GDP (float32) and Country_Name indexed by the sorted (Country_Code, Year) pairs with data
+
+    """
+
+    df = pd.read_excel(path, skiprows=3) # the first 3 rows are a title
+    df = df.rename(columns=lambda x: x.replace(' ', '_'))
+    years = [c for c in df.columns if c.isdigit()]
+
+    # a. melt to one row per country and year without going through object columns
+    values = df[years].to_numpy(dtype='float32')
+    n_countries, n_years = values.shape
+    codes = pd.Categorical(df.Country_Code)
+    names = pd.Categorical(df.Country_Name)
+    long = pd.DataFrame({
+        'Country_Code': pd.Categorical.from_codes(np.repeat(codes.codes, n_years), codes.categories),
+        'Year': np.tile(np.array(years, dtype='int16'), n_countries),
+        'Country_Name': pd.Categorical.from_codes(np.repeat(names.codes, n_years), names.categories),
+        'GDP': values.ravel(),
+    })
+
+    # b. remove country-years without data and sort the index for fast range queries
+    long = long.loc[long.GDP.notna()]
+    long = long.set_index(['Country_Code', 'Year']).sort_index()
+
+    return long
+
+
+def load_gdp_panel(path = 'GDP.xls', cache = True, cache_dir = None):
+    """ Load GDP for all countries and years as a long panel.
+
+    The panel is indexed by sorted (Country_Code, Year) pairs, so ranges of countries and years can be
+    selected with gdp.loc[(countries, slice(start, end)), :] without scanning the whole table.
+
+    Args:
+        path (str): path to GDP.xls
+        cache (bool): if True, use the binary cache (see _cached)
+        cache_dir (str): directory of the cache
+
+    Returns:
+        df (pd.DataFrame): GDP (float32) and Country_Name indexed by (Country_Code, Year)
+
+    """
+
+    return _cached(path, 'gdp-panel', _build_gdp_panel, cache, cache_dir)
+
+
+def merge_temperature(panel, temperature, columns = ('Mean',)):
+    """ Add the temperature series to every country of a GDP panel.
+
+    Args:
+        panel (pd.DataFrame): panel indexed by (Country_Code, Year), e.g. from load_gdp_panel
+        temperature (pd.DataFrame): table with a Year column, e.g. from load_temperature
+        columns (tuple): temperature columns to add
+
+    Returns:
+        df (pd.DataFrame): panel with the temperature columns added (NaN for years without temperature data)
+
+    """
+
+    temperature = temperature.set_index('Year')
+    years = panel.index.get_level_values('Year')
+
+    df = panel.copy()
+    for column in columns:
+        df[column] = temperature[column].reindex(years).to_numpy()
+
+    return df
+
+
+class RecursiveOLS:
+    """ OLS kept up to date from sufficient statistics.
+
+    Only X'X, X'y, y'y and the number of observations are stored, so adding observations (a new year,
+    or a whole new country series) updates the estimates at a cost independent of the history. With a
+    window, the oldest observations are removed again (downdated) so the estimates are rolling.
+
+    """
+
+    def __init__(self, n_regressors = 1, add_constant = True, window = None):
+        """ Initialize empty sufficient statistics.
+
+        Args:
+            n_regressors (int): number of regressors, excluding the constant
+            add_constant (bool): if True, a constant is added as the first regressor (as sm.add_constant)
+            window (int): if given, only the latest window observations are used
+
+        """
+
+        self.add_constant = add_constant
+        self.k = n_regressors + add_constant
+        self.window = window
+
+        self.n = 0
+        self.XtX = np.zeros((self.k, self.k))
+        self.Xty = np.zeros(self.k)
+        self.yty = 0.0
+        self.ysum = 0.0
+        self._history = deque() # observations in the window
+
+    def _design(self, x):
+        """ Turn regressors into a 2-D design matrix, adding the constant. """
+
+        X = np.asarray(x, dtype=float).reshape(-1, self.k - self.add_constant)
+        if self.add_constant:
+            X = np.column_stack([np.ones(len(X)), X])
+
+        return X
+
+    def _add(self, X, y, sign):
+        """ Add (sign = 1) or remove (sign = -1) observations from the sufficient statistics. """
+
+        self.n += sign*len(y)
+        self.XtX += sign*(X.T @ X)
+        self.Xty += sign*(X.T @ y)
+        self.yty += sign*(y @ y)
+        self.ysum += sign*y.sum()
+
+    def update(self, x, y):
+        """ Add one or more observations.
+
+        Args:
+            x: regressors, a scalar or array of shape (n,) or (n, n_regressors)
+            y: dependent variable, a scalar or array of shape (n,)
+
+        """
+
+        X = self._design(x)
+        y = np.asarray(y, dtype=float).reshape(-1)
+
+        # a. drop observations with missing values (as dropna in the notebook)
+        ok = ~np.isnan(y) & ~np.isnan(X).any(axis=1)
+        X, y = X[ok], y[ok]
+
+        # b. update
+        self._add(X, y, 1)
+
+        # c. remove the oldest observations outside the window
+        if self.window is not None:
+            for row in range(len(y)):
+                self._history.append((X[row], y[row]))
+            while len(self._history) > self.window:
+                X_old, y_old = self._history.popleft()
+                self._add(X_old[None, :], np.array([y_old]), -1)
+
+    def merge(self, other):
+        """ Pool the observations of another RecursiveOLS (e.g. another country) into this one.
+
+        Args:
+            other (RecursiveOLS): estimates with the same regressors and no window
+
+        """
+
+        if self.window is not None or other.window is not None or self.k != other.k:
+            raise ValueError('Only estimates with the same regressors and no window can be merged')
+
+        self.n += other.n
+        self.XtX += other.XtX
+        self.Xty += other.Xty
+        self.yty += other.yty
+        self.ysum += other.ysum
+
+    @property
+    def params(self):
+        """ Estimated coefficients (constant first). """
+
+        return np.linalg.solve(self.XtX, self.Xty)
+
+    @property
+    def ssr(self):
+        """ Sum of squared residuals. """
+
+        return self.yty - self.params @ self.Xty
+
+    @property
+    def bse(self):
+        """ Standard errors of the coefficients. """
+
+        sigma2 = self.ssr/(self.n - self.k)
+
+        return np.sqrt(sigma2*np.diag(np.linalg.inv(self.XtX)))
+
+    @property
+    def tvalues(self):
+        """ t-statistics of the coefficients. """
+
+        return self.params/self.bse
+
+    @property
+    def rsquared(self):
+        """ R-squared (centered if there is a constant). """
+
+        tss = self.yty - self.ysum**2/self.n if self.add_constant else self.yty
+
+        return 1 - self.ssr/tss
+
+
+class RollingMoments:
+    """ Rolling mean and standard deviation updated in O(1) per observation. """
+
+    def __init__(self, window):
+        """ Initialize an empty window.
+
+        Args:
+            window (int): number of observations in the window
+
+        """
+
+        self.window = window
+        self.values = deque()
+        self.sum = 0.0
+        self.sumsq = 0.0
+
+    def update(self, x):
+        """ Add an observation, removing the oldest one if the window is full.
+
+        Args:
+            x (float): new observation (NaN is ignored)
+
+        Returns:
+            mean (float): the rolling mean after the update
+
+        """
+
+        if not np.isnan(x):
+            self.values.append(x)
+            self.sum += x
+            self.sumsq += x*x
+            if len(self.values) > self.window:
+                old = self.values.popleft()
+                self.sum -= old
+                self.sumsq -= old*old
+
+        return self.mean
+
+    @property
+    def mean(self):
+        """ Mean of the window. """
+
+        return self.sum/len(self.values) if self.values else np.nan
+
+    @property
+    def std(self):
+        """ Sample standard deviation of the window (as pandas' rolling std). """
+
+        n = len(self.values)
+        if n < 2:
+            return np.nan
 
-    """ 
-    
-    for r in regs:
-        I = df.reg.str.contains(r)
-        df = df.loc[I == False] # keep everything else
-    
-    return df
\ No newline at end of file
+        return np.sqrt(max(self.sumsq - self.sum**2/n, 0)/(n - 1))
@@ -1,3 +1,4 @@
+import time
 import numpy as np
 import scipy
 from Model import *
@@ -49,12 +50,13 @@ def utility(c1, c2, l, par):
 
     return np.log(c1**par.alpha*c2**(1-par.alpha))-par.nu*(l**(1+par.epsilon))/(1+par.epsilon)
 
-def labor_supply(par, p1, p2, tau, T):
+def labor_supply(par, p1, p2, tau, T, stats=None):
     '''Labor supply
     
     Args:
         p1: price of good 1
         p2: price of good 2
+        stats: object collecting solver statistics (see production_economy.instrument), None to disable
     Returns:
         Labor supply
     '''
@@ -67,20 +69,28 @@ def labor_supply(par, p1, p2, tau, T):
     
     # Perform optimization
     initial_guess = 0.5
-    l = scipy.optimize.minimize(objective_function, initial_guess).x
+    if stats is None:
+        l = scipy.optimize.minimize(objective_function, initial_guess).x
+    else:
+        start = time.perf_counter()
+        res = scipy.optimize.minimize(objective_function, initial_guess)
+        stats.record('labor_supply.minimize', time.perf_counter() - start)
+        stats.count('labor_supply.nfev', res.nfev)
+        l = res.x
 
     return l.item()
 
-def demand(par, p1, p2, tau, T):
+def demand(par, p1, p2, tau, T, stats=None):
     '''Demand
     
     Args:
         l: Labor
+        stats: object collecting solver statistics, passed on to labor_supply
     Returns:
         Demand
     '''
-    c1 = par.alpha*(par.w*labor_supply(par,p1,p2,tau,T)+T+profit(par, p1)+profit(par, p2))/p1
-    c2 = (1-par.alpha)*(par.w*labor_supply(par,p1,p2,tau,T)+T+profit(par, p1)+profit(par, p2))/(p2+tau)
+    c1 = par.alpha*(par.w*labor_supply(par,p1,p2,tau,T,stats)+T+profit(par, p1)+profit(par, p2))/p1
+    c2 = (1-par.alpha)*(par.w*labor_supply(par,p1,p2,tau,T,stats)+T+profit(par, p1)+profit(par, p2))/(p2+tau)
 
     return c1, c2
 
@@ -112,17 +122,21 @@ def SWF(tau, T, p1, p2, par):
 
     return utility_SWF(par, tau, T, p1, p2) - par.kappa*production(par, p2)
 
-def Walras_law(prices, tau, T, par):
+def Walras_law(prices, tau, T, par, stats=None):
     '''Use Walras law to get market clearing
     
     Args:
         p1: price of good 1
+        stats: object collecting solver statistics, counting the calls and passed on to labor_supply
     Returns:
         Market clearing
     '''
 
     p1, p2 = prices
 
+    if stats is not None:
+        stats.count('Walras_law')
+
     # Labor demanded by the firms
     l1 = labor_demand(par, p1)
     l2 = labor_demand(par, p2)
@@ -132,10 +146,10 @@ def Walras_law(prices, tau, T, par):
     y2 = production(par, p2)
 
     # Labor supply
-    ell = labor_supply(par, p1, p2, tau, T)
+    ell = labor_supply(par, p1, p2, tau, T, stats)
 
     # Household consumption
-    c1 , c2 = demand(par, p1, p2, tau, T)
+    c1 , c2 = demand(par, p1, p2, tau, T, stats)
     if c1 < 0 or c2 < 0:
         return np.inf, np.inf
 
@@ -153,3 +167,134 @@ def Walras_law(prices, tau, T, par):
 
 
 
+# Vectorized versions, for many prices and policies at once
+
+def labor_supply_foc(par, p1, p2, tau, T, tol=1e-12, maxiter=100):
+    '''Labor supply from the first-order condition, for arrays of prices and policies
+    
+    With income I = w*l + T + profits, utility is log(I) plus terms that do not depend on l, so the optimal
+    labor solves nu*l**epsilon*(w*l + M) = w, where M = T + profits. The left-hand side is increasing in l,
+    and it is solved with Newton's method from a point where it is above w.
+    
+    Args:
+        p1: price of good 1
+        p2: price of good 2
+        tau: tax (does not affect labor supply, kept for the same arguments as labor_supply)
+        T: transfer
+    Returns:
+        Labor supply, with the broadcast shape of the arguments
+    '''
+    p1, p2, tau, T = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (p1, p2, tau, T)))
+    M = (T + profit(par, p1) + profit(par, p2)).ravel()
+    lower = np.maximum(0, -M/par.w)      # Income must be positive
+
+    l = (1/par.nu)**(1/(1+par.epsilon)) + lower
+    active = np.flatnonzero(np.isfinite(M))
+    for _ in range(maxiter):
+        la, Ma = l[active], M[active]
+        g = par.nu*la**par.epsilon*(par.w*la + Ma) - par.w
+        keep = np.abs(g) > tol*par.w
+        if not keep.any():
+            break
+        active, la, Ma, g = active[keep], la[keep], Ma[keep], g[keep]
+
+        dg = par.nu*(par.epsilon*la**(par.epsilon-1)*(par.w*la + Ma) + par.w*la**par.epsilon)
+        l_new = la - g/dg
+        l[active] = np.where(l_new > lower[active], l_new, (la + lower[active])/2)   # Bisect towards the bound if a step overshoots it
+
+    l[~np.isfinite(M)] = np.nan
+    return l.reshape(p1.shape)
+
+
+def Walras_law_vec(p1, p2, tau, T, par):
+    '''Market clearing for arrays of prices and policies (see Walras_law)
+    
+    Returns:
+        good2_market_clear: Excess supply of good 2
+        labor_market_clear: Excess supply of labor
+        l: Labor supply
+        c1, c2: Consumption
+    '''
+    l = labor_supply_foc(par, p1, p2, tau, T)
+    income = par.w*l + T + profit(par, p1) + profit(par, p2)
+    c1 = par.alpha*income/p1
+    c2 = (1-par.alpha)*income/(p2+tau)
+
+    return production(par, p2) - c2, l - labor_demand(par, p1) - labor_demand(par, p2), l, c1, c2
+
+
+def equilibrium_vec(par, tau, T, guess=(1.0, 1.0), tol=1e-10, maxiter=50):
+    '''Equilibrium prices for arrays of policies, with Newton's method in log prices
+    
+    Only the policies that have not converged are iterated, so a few policies without an equilibrium
+    do not slow down the others.
+    
+    Args:
+        tau: taxes
+        T: transfers
+        guess: initial guess for the prices
+        tol: largest allowed excess supply
+        maxiter: maximum number of Newton steps
+    Returns:
+        p1, p2: Equilibrium prices (nan where the solver did not converge)
+        converged: Mask of the policies where the markets clear
+    '''
+    tau, T = np.broadcast_arrays(np.asarray(tau, dtype=float), np.asarray(T, dtype=float))
+    shape = tau.shape
+    tau, T = tau.ravel(), T.ravel()
+    h = 1e-7
+
+    def residual(x, i):
+        # Excess supplies at log prices x for the policies i
+        with np.errstate(all='ignore'):
+            r2, rl = Walras_law_vec(np.exp(x[0]), np.exp(x[1]), tau[i], T[i], par)[:2]
+        F = np.stack([r2, rl])
+        return np.where(np.isfinite(F), F, np.inf)
+
+    x = np.log(np.array(guess, dtype=float))[:, None].repeat(tau.size, axis=1)
+    converged = np.zeros(tau.size, dtype=bool)
+    pending = np.arange(tau.size)
+    F = residual(x, pending)
+
+    for _ in range(maxiter):
+        done = np.max(np.abs(F), axis=0) < tol
+        converged[pending[done]] = True
+        keep = ~done & np.isfinite(F).all(axis=0)     # Policies where the markets cannot clear are dropped
+        pending, F = pending[keep], F[:, keep]
+        if len(pending) == 0:
+            break
+        xp = x[:, pending]
+
+        # Jacobian by forward differences, and the Newton step of the 2x2 system
+        with np.errstate(all='ignore'):
+            J0 = (residual(xp + [[h], [0]], pending) - F)/h
+            J1 = (residual(xp + [[0], [h]], pending) - F)/h
+            det = J0[0]*J1[1] - J1[0]*J0[1]
+            step = -np.stack([J1[1]*F[0] - J1[0]*F[1], J0[0]*F[1] - J0[1]*F[0]])/det
+        step = np.where(np.isfinite(step), step, 0)
+
+        # Halve the step where it makes the residual worse
+        norm = np.max(np.abs(F), axis=0)
+        F_new = residual(xp + step, pending)
+        worse = np.flatnonzero(np.max(np.abs(F_new), axis=0) > norm)
+        for _ in range(10):
+            if len(worse) == 0:
+                break
+            step[:, worse] /= 2
+            F_new[:, worse] = residual(xp[:, worse] + step[:, worse], pending[worse])
+            worse = worse[np.max(np.abs(F_new[:, worse]), axis=0) > norm[worse]]
+        x[:, pending] = xp + step
+        F = F_new
+
+    converged[pending[np.max(np.abs(F), axis=0) < tol]] = True
+    p1, p2 = np.where(converged, np.exp(np.where(converged, x, 0)), np.nan)
+
+    return p1.reshape(shape), p2.reshape(shape), converged.reshape(shape)
+
+
+def SWF_vec(par, tau, T, p1, p2):
+    '''Social welfare for arrays of policies and prices (see SWF)'''
+    l, c1, c2 = Walras_law_vec(p1, p2, tau, T, par)[2:]
+    with np.errstate(all='ignore'):
+        U = np.log(c1**par.alpha*c2**(1-par.alpha)) - par.nu*(l**(1+par.epsilon))/(1+par.epsilon)
+    return U - par.kappa*production(par, p2)
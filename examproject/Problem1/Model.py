@@ -1,15 +1,42 @@
 from types import SimpleNamespace
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
 import numpy as np
 import scipy
 
-from Funcs import labor_demand, production, demand
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))  # repository folder, for common
+from common.params import Params
+
+import Funcs
+from Funcs import labor_demand, production, demand, Walras_law
+
+
+class EconomyParams(Params):
+    '''Parameters of the production economy'''
+    __slots__ = ('A', 'gamma', 'w', 'alpha', 'nu', 'epsilon', 'tau', 'T', 'kappa', 'p1', 'p2')
+
 
 class production_economy:
     def __init__(self):
         '''Initialize the model'''
-        self.par = SimpleNamespace()
+        self.par = EconomyParams()
+        self.stats = None
 
         self.setup()
+
+    def instrument(self, stats):
+        '''Attach an object collecting solver statistics
+        
+        Only this model reports to it: the solvers pass it on to the functions in Funcs (labor_supply, Walras_law),
+        which take it as an argument. The refinements of optimal_policy run in other processes and are only
+        reported through the totals recorded here (the time of the call and the number of evaluations).
+        
+        Args:
+            stats: object with the methods of common.SolverStats (count, record and timer), or None to disable
+        '''
+        self.stats = stats
     
     def setup(self):
         '''Defined parameters'''
@@ -74,6 +101,261 @@ class production_economy:
             return None
         
         return ell, c1, c2
-    
-    
+
+    def solve_equilibrium(self, tau=None, T=None, guess=None):
+        '''Equilibrium prices from Walras' law
+        
+        Args:
+            tau: tax (par.tau if None)
+            T: transfer (par.T if None)
+            guess: initial guess for the prices ([par.p1, par.p2] if None)
+        Returns:
+            prices: equilibrium prices p1 and p2
+            converged: True if fsolve converged
+        '''
+        par = self.par
+        tau = par.tau if tau is None else tau
+        T = par.T if T is None else T
+        guess = [par.p1, par.p2] if guess is None else guess
+
+        # Time the solve, so the nested labor supply optimizations are recorded under it
+        timer = self.stats.timer('solve_equilibrium') if self.stats is not None else nullcontext()
+        with timer:
+            prices, info, ier, msg = scipy.optimize.fsolve(Walras_law, guess, args=(tau, T, par, self.stats), full_output=True)
+
+        if self.stats is not None:
+            self.stats.count('solve_equilibrium.nfev', info['nfev'])
+
+        return prices, ier == 1
+
+    def equilibrium_path(self, taus, Ts, guess=None, min_step=1/64, tol=1e-8, maxiter=20):
+        '''Equilibrium prices along a path of taxes and transfers
+
+        Each equilibrium is predicted from the previous ones (secant extrapolation) and corrected with
+        quasi-Newton (Broyden) steps on Walras' law, where the Jacobian is carried along the path instead of
+        being rebuilt by finite differences at every point. If the correction fails, the Jacobian is rebuilt
+        and the step towards the next policy is halved; it is doubled again after successful steps.
         
+        Args:
+            taus: taxes along the path
+            Ts: transfers along the path
+            guess: initial guess for the prices at the first point ([par.p1, par.p2] if None)
+            min_step: smallest step (as a share of the distance between two points) before a point is given up
+            tol: largest allowed residual of Walras' law
+            maxiter: largest number of quasi-Newton steps per correction
+        Returns:
+            path: namespace with tau, T, the prices p1 and p2, a convergence mask and the number of residual evaluations
+        '''
+        par = self.par
+        taus = np.asarray(taus, dtype=float)
+        Ts = np.asarray(Ts, dtype=float)
+        n = len(taus)
+
+        p = np.full((n, 2), np.nan)
+        converged = np.zeros(n, dtype=bool)
+        nfev = 0
+
+        def policy(lam):
+            # policy at the (fractional) position lam along the path
+            i = min(int(lam), n-2) if n > 1 else 0
+            w = lam - i
+            return (1-w)*taus[i] + w*taus[min(i+1, n-1)], (1-w)*Ts[i] + w*Ts[min(i+1, n-1)]
+
+        def residual(x, tau, T):
+            nonlocal nfev
+            nfev += 1
+            return np.array(Walras_law(x, tau, T, par, self.stats), dtype=float)
+
+        def jacobian(x, F, tau, T):
+            # forward differences
+            J = np.empty((2, 2))
+            for j in range(2):
+                h = 1e-7*max(1, abs(x[j]))
+                x_h = x.copy()
+                x_h[j] += h
+                J[:, j] = (residual(x_h, tau, T) - F)/h
+            return J
+
+        def correct(x, J, lam):
+            # quasi-Newton corrector, returns the prices, the updated Jacobian and whether it converged
+            tau, T = policy(lam)
+            F = residual(x, tau, T)
+            if not np.all(np.isfinite(F)):
+                return x, J, False
+            if J is None:
+                J = jacobian(x, F, tau, T)
+            for _ in range(maxiter):
+                if np.max(np.abs(F)) < tol:
+                    return x, J, bool(np.all(x > 0))
+                try:
+                    dx = -np.linalg.solve(J, F)
+                except np.linalg.LinAlgError:
+                    return x, None, False
+                x_new = x + dx
+                F_new = residual(x_new, tau, T)
+                if not np.all(np.isfinite(F_new)) or np.any(x_new <= 0):
+                    return x, None, False
+                J = J + np.outer(F_new - F - J @ dx, dx)/(dx @ dx)     # Broyden update
+                x, F = x_new, F_new
+            return x, None, False
+
+        timer = self.stats.timer('equilibrium_path') if self.stats is not None else nullcontext()
+        with timer:
+            guess = np.asarray([par.p1, par.p2] if guess is None else guess, dtype=float)
+            history = []    # last two solutions as (position, prices)
+            J = None
+            lam = 0.0
+            step = 1.0
+
+            for i in range(n):
+                while True:
+                    lam_new = min(lam + step, i) if history else float(i)
+
+                    # predict from the last two solutions (or the last one, or the guess)
+                    if len(history) >= 2 and history[1][0] > history[0][0]:
+                        (lam0, p0), (lam1, p1) = history
+                        prediction = p1 + (p1 - p0)*(lam_new - lam1)/(lam1 - lam0)
+                    elif history:
+                        prediction = history[-1][1]
+                    else:
+                        prediction = guess
+
+                    prices, J_new, ok = correct(prediction, J, lam_new)
+                    if not ok and J is not None:
+                        prices, J_new, ok = correct(prediction, None, lam_new)     # retry with a fresh Jacobian
+
+                    if ok:
+                        lam, J = lam_new, J_new
+                        history = history[-1:] + [(lam, prices)]
+                        step = min(2*step, 1.0)
+                        if lam >= i:
+                            p[i], converged[i] = prices, True
+                            break
+                    elif history and step > min_step:
+                        step = step/2
+                    else:
+                        # give up on this point and start the next one from the guess
+                        history, J, lam, step = [], None, float(i), 1.0
+                        break
+
+        if self.stats is not None:
+            self.stats.count('equilibrium_path.nfev', nfev)
+
+        return SimpleNamespace(tau=taus, T=Ts, p1=p[:, 0], p2=p[:, 1], converged=converged, nfev=nfev)
+
+    def equilibrium_grid(self, taus, Ts, guess=None):
+        '''Equilibrium prices on a grid of taxes and transfers
+
+        The grid is walked as a snake (every other row reversed), so consecutive points are neighbours
+        and equilibrium_path can continue from one point to the next.
+        
+        Args:
+            taus: grid of taxes (1-D)
+            Ts: grid of transfers (1-D)
+            guess: initial guess for the prices at the first point
+        Returns:
+            grid: namespace with tau, T, p1, p2 and converged of shape (len(taus), len(Ts)) and the number of residual evaluations
+        '''
+        taus = np.asarray(taus, dtype=float)
+        Ts = np.asarray(Ts, dtype=float)
+        tau_grid, T_grid = np.meshgrid(taus, Ts, indexing='ij')
+
+        # snake ordering of the grid points
+        order = np.arange(tau_grid.size).reshape(tau_grid.shape)
+        order[1::2] = order[1::2, ::-1]
+        order = order.ravel()
+
+        path = self.equilibrium_path(tau_grid.ravel()[order], T_grid.ravel()[order], guess)
+
+        def unsnake(x):
+            out = np.empty_like(x)
+            out[order] = x
+            return out.reshape(tau_grid.shape)
+
+        return SimpleNamespace(tau=tau_grid, T=T_grid, p1=unsnake(path.p1), p2=unsnake(path.p2), converged=unsnake(path.converged), nfev=path.nfev)
+
+    def optimal_policy(self, taus=np.linspace(-0.5, 1.0, 151), Ts=np.linspace(-0.5, 1.0, 151), candidates=4, workers=None, do_print=False):
+        '''Tax and transfer maximizing social welfare, by a grid search followed by local refinements
+        
+        Social welfare (utility_SWF minus kappa times production of good 2) is evaluated at the market-clearing
+        prices on the whole (tau, T) grid at once, with the labor supply from its first-order condition. On every row
+        of the grid, the transfer closest to balancing the budget (T = tau*y2) is kept, and the best local maxima
+        along tau start SLSQP refinements with the market clearing and budget constraints, run in parallel processes.
+        
+        Args:
+            taus: grid of taxes
+            Ts: grid of transfers
+            candidates: number of local refinements
+            workers: number of processes (the number of cores if None, 1 runs the refinements in this process)
+            do_print: if True, the optimum is printed
+        Returns:
+            optimum: namespace with tau, T, p1, p2 and swf of the best refinement, the grid (tau, T, p1, p2, swf,
+                budget and converged) and the results of the refinements
+        '''
+        par = self.par
+        timer = self.stats.timer('optimal_policy') if self.stats is not None else nullcontext()
+        with timer:
+            # 1. Welfare on the grid
+            tau_grid, T_grid = np.meshgrid(taus, Ts, indexing='ij')
+            p1, p2, converged = Funcs.equilibrium_vec(par, tau_grid, T_grid)
+            swf = Funcs.SWF_vec(par, tau_grid, T_grid, p1, p2)
+            budget = T_grid - tau_grid*production(par, p2)
+            grid = SimpleNamespace(tau=tau_grid, T=T_grid, p1=p1, p2=p2, swf=swf, budget=budget, converged=converged)
+
+            # 2. Welfare along the budget: the closest transfer on each row
+            valid = converged & np.isfinite(swf)
+            rows = np.flatnonzero(valid.any(axis=1))
+            cols = np.argmin(np.where(valid, np.abs(budget), np.inf)[rows], axis=1)
+            profile = swf[rows, cols]
+
+            # Local maxima first, then the best of the other points
+            is_max = np.ones(len(rows), dtype=bool)
+            is_max[1:] &= profile[1:] >= profile[:-1]
+            is_max[:-1] &= profile[:-1] >= profile[1:]
+            order = np.lexsort((-profile, ~is_max))[:candidates]
+            starts = [[tau_grid[rows[i], cols[i]], p1[rows[i], cols[i]], p2[rows[i], cols[i]], T_grid[rows[i], cols[i]]] for i in order]
+
+            # 3. Local refinements
+            if workers == 1 or len(starts) == 1:
+                refinements = [_refine_policy(par, x0) for x0 in starts]
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    refinements = list(pool.map(_refine_policy, [par]*len(starts), starts))
+
+        if self.stats is not None:
+            self.stats.count('optimal_policy.grid_points', tau_grid.size)
+            self.stats.count('optimal_policy.refinement_nfev', sum(res.nfev for res in refinements))
+
+        success = [res for res in refinements if res.success] or refinements
+        best = min(success, key=lambda res: res.fun)
+        tau, p1_opt, p2_opt, T = best.x
+        optimum = SimpleNamespace(tau=tau, T=T, p1=p1_opt, p2=p2_opt, swf=-best.fun, success=best.success, grid=grid, refinements=refinements)
+
+        if do_print:
+            print(f'Optimal tax rate: {tau:.4f}')
+            print(f'Optimal transfer: {T:.4f}')
+            print(f'Optimal prices: p1 = {p1_opt:.4f}, p2 = {p2_opt:.4f}')
+            print(f'Social welfare: {optimum.swf:.6f}')
+
+        return optimum
+
+
+def _refine_policy(par, x0):
+    '''Local SLSQP refinement of the tax and transfer (at module level, so it can run in another process)
+    
+    Args:
+        x0: initial guess [tau, p1, p2, T] (the order of the variables in the notebook)
+    Returns:
+        res: result of scipy.optimize.minimize
+    '''
+    def objective(x):
+        tau, p1, p2, T = x
+        return -float(Funcs.SWF_vec(par, tau, T, p1, p2))
+
+    def constraints(x):
+        tau, p1, p2, T = x
+        good2, labor = Funcs.Walras_law_vec(p1, p2, tau, T, par)[:2]
+        return np.array([labor, good2, T - tau*production(par, p2)], dtype=float)
+
+    bounds = [(None, None), (1e-6, None), (1e-6, None), (None, None)]
+    return scipy.optimize.minimize(objective, x0, constraints={'type': 'eq', 'fun': constraints}, bounds=bounds, method='SLSQP', tol=1e-10)
@@ -1,3 +1,4 @@
+import functools
 import numpy as np
 import scipy  
 import matplotlib.pyplot as plt
@@ -8,17 +9,31 @@ model.setup()
 par = model.par
 
 
-def sim_utility(par):
+def _timed(func):
+    '''Decorator timing a function when it is called with a stats object (stats=..., see graduate_model.instrument)'''
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stats = kwargs.get('stats')
+        if stats is None:
+            return func(*args, **kwargs)
+        with stats.timer(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+@_timed
+def sim_utility(par, seed=42, stats=None):
     '''Simulate utility
     
     Args:
-        None
+        seed: Seed of the random numbers
+        stats: Object collecting solver statistics (see graduate_model.instrument), None disables them
     
     Returns:
         realised_utility: Array of actual utilities
         expected_utility: Array of expected utilities given their friends
         realised_utility_mean: Array of average actual utilities'''
-    np.random.seed(42)          # Set seed
+    np.random.seed(seed)        # Set seed
 
     # Arrays to store utilities
     expected_utility = np.zeros((par.J))
@@ -52,11 +67,13 @@ def sim_utility(par):
     return realised_utility, expected_utility, realised_utility_mean
 
 
-def friend_utility(par):
+@_timed
+def friend_utility(par, seed=42, stats=None):
     '''Simulate utility for graduates when they consider their friends
     
     Args:
-        None
+        seed: Seed of the random numbers
+        stats: Object collecting solver statistics (see graduate_model.instrument), None disables them
     
     Returns:
         actual_epsilon_storage: Storage of actual epsilons (used for testing)
@@ -64,7 +81,7 @@ def friend_utility(par):
         career_choice: Array of career choices
         actual_utility: Array of actual utilities given their friends'''
 
-    np.random.seed(42)
+    np.random.seed(seed)
 
     # Arrays to store results
     actual_epsilon_storage = np.zeros((par.N, par.K, par.J))
@@ -101,17 +118,22 @@ def friend_utility(par):
                 # Calculate actual utility
                 actual_utility[i, k, :] = par.v + epsilon_actual
 
+    # Number of random draws (friends' and own epsilons)
+    if stats is not None:
+        stats.count('friend_utility.draws', par.K*par.J*par.J*np.sum(np.arange(1, par.N+1) + 1))
 
     return actual_epsilon_storage, expected_utility, career_choice, actual_utility
 
 
-def analyze(par, career_choice, expected_utility, actual_utility):
+@_timed
+def analyze(par, career_choice, expected_utility, actual_utility, stats=None):
     '''Analyze the results of the simulation
     
     Args:
         career_choice: Array of career choices
         expected_utility: Array of expected utilities given their friends
         actual_utility: Array of actual utilities given their friends
+        stats: Object collecting solver statistics (see graduate_model.instrument), None disables them
     
     Returns:
         career_shares: Array of shares of graduates choosing each career for each type of graduate
@@ -173,13 +195,15 @@ def plotting(career_shares, expected_average_utility, actual_average_utility):
 
 
 
-def switch(par, career_choice, expected_utility, actual_utility):
+@_timed
+def switch(par, career_choice, expected_utility, actual_utility, stats=None):
     '''Function to calculate career switching
     
     Args:
         career_choice: Array of career choices
         expected_utility: Array of expected utilities given their friends
         actual_utility: Array of actual utilities given their friends
+        stats: Object collecting solver statistics (see graduate_model.instrument), None disables them
     
     Returns:
         choice_utility: Utility of their choice
@@ -229,6 +253,104 @@ def switch(par, career_choice, expected_utility, actual_utility):
 
     return choice_utility, new_career_choice, career_shares, expected_average_utility, actual_average_utility
 
+@_timed
+def learning_dynamics(par, rounds=100, signals=0, seed=42, initial=None, stats=None):
+    '''Simulate several rounds of learning and career switching, vectorized over graduates and simulations
+    
+    Every round, graduates learn the actual utility of their current career and hear signals (utility of a career
+    plus a N(0, sigma) error) from signals new friends about each career. Their belief in a career they have worked in is
+    its actual utility, and otherwise the average of all signals heard about it (the prior from their friends counts as
+    Fi signals). They then switch to the career with the highest belief, where every career other than the current
+    one costs par.c. With signals=0 and the initial state of friend_utility, the first round is the same as switch.
+    
+    Args:
+        rounds: Number of rounds
+        signals: Number of new signals about each career heard every round
+        seed: Seed of the random numbers
+        initial: Tuple (expected_utility, career_choice, actual_utility) from friend_utility, drawn here if None
+        stats: Object collecting solver statistics (see graduate_model.instrument), None disables them
+    
+    Returns:
+        career_shares: Array of shares of graduates in each career after each round, shape (rounds, N, J)
+        expected_average_utility: Array of average belief (net of the switching cost) of the chosen career, shape (rounds, N)
+        actual_average_utility: Array of average actual utility of the chosen career, shape (rounds, N)
+        switch_shares: Array of shares of graduates switching in each round, shape (rounds, N)
+        average_cost: Array of average switching costs paid up to each round, shape (rounds, N)'''
+    rng = np.random.default_rng(seed)
+    F = np.arange(1, par.N+1)[:, None, None]    # Number of friends of each type of graduate
+
+    # Initial state
+    if initial is None:
+        # The average of Fi friends' errors is N(0, sigma^2/Fi)
+        prior = par.v + par.sigma/np.sqrt(F)*rng.standard_normal((par.N, par.K, par.J))
+        actual_utility = par.v + par.sigma*rng.standard_normal((par.N, par.K, par.J))
+        career = np.argmax(prior, axis=2)
+    else:
+        prior, career, actual_utility = (np.asarray(x) for x in initial)
+        career = career.copy()
+
+    signal_sum = (prior - par.v)*F      # Sum of the errors of the signals heard about each career
+    signal_count = F.astype(float)      # Number of signals heard about each career (the same for all careers of a type)
+    known = np.zeros(prior.shape, dtype=bool)   # Careers whose actual utility is known
+    cost = np.zeros((par.N, par.K))
+    
+    # Containers for results
+    career_shares = np.zeros((rounds, par.N, par.J))
+    expected_average_utility = np.zeros((rounds, par.N))
+    actual_average_utility = np.zeros((rounds, par.N))
+    switch_shares = np.zeros((rounds, par.N))
+    average_cost = np.zeros((rounds, par.N))
+
+    # Flat indices of the current career of every graduate and simulation, and of the type of each graduate
+    base = np.arange(par.N*par.K)*par.J
+    graduate_type = np.repeat(np.arange(par.N), par.K)
+    career = career.ravel()
+    actual_flat = actual_utility.reshape(-1)
+    belief = np.empty(prior.size)
+    draws = np.empty(prior.shape)
+    unknown_belief = (par.v + signal_sum/signal_count).ravel()
+
+    for t in range(rounds):
+        # 1. Learn the current career and hear new signals
+        known.reshape(-1)[base + career] = True
+        if signals > 0:
+            rng.standard_normal(out=draws)
+            draws *= par.sigma*np.sqrt(signals)     # Sum of the errors of the new signals
+            signal_sum += draws
+            signal_count += signals
+            np.multiply(signal_sum, 1/signal_count, out=draws)
+            draws += par.v
+            unknown_belief = draws.reshape(-1)
+
+        # 2. Beliefs, net of the cost of switching
+        np.copyto(belief, unknown_belief)
+        np.copyto(belief, actual_flat, where=known.reshape(-1))
+        belief -= par.c
+        belief[base + career] += par.c
+
+        # 3. Switch to the best career
+        new_career = np.argmax(belief.reshape(-1, par.J), axis=1)
+        switched = new_career != career
+        cost += par.c*switched.reshape(par.N, par.K)
+        career = new_career
+
+        # 4. Aggregates for each type of graduate
+        chosen = base + career
+        career_shares[t] = np.bincount(graduate_type*par.J + career, minlength=par.N*par.J).reshape(par.N, par.J)/par.K
+        expected_average_utility[t] = belief[chosen].reshape(par.N, par.K).mean(axis=1)
+        actual_average_utility[t] = actual_flat[chosen].reshape(par.N, par.K).mean(axis=1)
+        switch_shares[t] = switched.reshape(par.N, par.K).mean(axis=1)
+        average_cost[t] = cost.mean(axis=1)
+
+        # Without new signals, nothing changes once nobody switches
+        if signals == 0 and not switched.any():
+            for x in (career_shares, expected_average_utility, actual_average_utility, average_cost):
+                x[t+1:] = x[t]
+            break
+
+    return career_shares, expected_average_utility, actual_average_utility, switch_shares, average_cost
+
+
 # The following plotting function is made using Copilot
 def plot_switch_shares(par, career_choice, new_career_choice):
     '''Plot the share of graduates that switch careers conditional on their initial career choice'''
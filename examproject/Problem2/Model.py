@@ -1,16 +1,70 @@
 from types import SimpleNamespace
+import os
+import sys
 import numpy as np
 import scipy
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))  # repository folder, for common
+from common.params import Params
+
+import Funcs
 from Funcs import *
+from Store import ResultStore
+
+
+class GraduateParams(Params):
+    '''Parameters of the graduate model'''
+    __slots__ = ('J', 'N', 'K', 'F', 'sigma', 'v', 'c')
 
 
 class graduate_model:
     def __init__(self):
         '''Initialize the model'''
-        self.par = SimpleNamespace()
+        self.par = GraduateParams()
+        self.stats = None
 
         self.setup()
+
+    def instrument(self, stats):
+        '''Attach an object collecting statistics on the simulations
+        
+        Only this model reports to stats: simulate passes it to the functions in Funcs as their stats argument,
+        and calls of these functions outside the model are not timed unless they are given stats themselves.
+
+        Args:
+            stats: object with the methods of common.SolverStats (count, record and timer), or None to disable
+        '''
+        self.stats = stats
+
+    def simulate(self, seed=42, store=None):
+        '''Simulate the career choices with friends and the switching, reusing stored results
+        
+        Args:
+            seed: Seed of the random numbers
+            store: ResultStore to load the results from and save them to (None computes them without storing)
+        
+        Returns:
+            friends: Namespace with the results of friend_utility
+            switching: Namespace with the results of switch
+        '''
+        par = self.par
+        friend_names = ('actual_epsilon_storage', 'expected_utility', 'career_choice', 'actual_utility')
+        switch_names = ('choice_utility', 'new_career_choice', 'career_shares', 'expected_average_utility', 'actual_average_utility')
+
+        if store is None:
+            friends = SimpleNamespace(**dict(zip(friend_names, Funcs.friend_utility(par, seed, stats=self.stats))))
+        else:
+            friends = store.cached(par, seed, 'friend_utility', lambda: Funcs.friend_utility(par, seed, stats=self.stats), friend_names)
+
+        def compute_switch():
+            return Funcs.switch(par, friends.career_choice, friends.expected_utility, friends.actual_utility, stats=self.stats)
+
+        if store is None:
+            switching = SimpleNamespace(**dict(zip(switch_names, compute_switch())))
+        else:
+            switching = store.cached(par, seed, 'switch', compute_switch, switch_names)
+
+        return friends, switching
     
     def setup(self):
         '''Defined parameters'''
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import shutil
+from types import SimpleNamespace
+
+import numpy as np
+
+# Parameters the simulations depend on
+KEY_PARAMS = ('J', 'N', 'K', 'sigma', 'v', 'c')
+STORE_VERSION = 1
+
+
+class ResultStore:
+    def __init__(self, directory=None, compress=False):
+        '''Store of simulation results on disk
+
+        Every entry is a directory named by a hash of the parameters and the seed, holding one .npy file
+        per array (or one compressed .npz file) and a json file with the parameters. Arrays are reopened
+        memory-mapped, so large runs are not read into memory before they are used.
+
+        Args:
+            directory: Directory of the store (__resultcache__ next to this file if None)
+            compress: Save new entries as a compressed .npz file instead of .npy files (these cannot be memory-mapped)
+        '''
+        if directory is None:
+            directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__resultcache__')
+        self.directory = directory
+        self.compress = compress
+
+    def key(self, par, seed, name):
+        '''Key of an entry
+
+        Args:
+            par: Parameters of the model
+            seed: Seed of the random numbers
+            name: Name of the results (e.g. 'friend_utility')
+
+        Returns:
+            key: Name of the entry followed by a sha1 hash of the parameters and the seed
+        '''
+        params = self._params(par, seed)
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+        return f'{name}-{digest[:16]}'
+
+    def _params(self, par, seed):
+        '''Parameters of an entry as json-friendly values'''
+        params = {name: np.asarray(getattr(par, name)).tolist() for name in KEY_PARAMS}
+        params['seed'] = seed
+        params['version'] = STORE_VERSION
+        return params
+
+    def path(self, par, seed, name):
+        '''Directory of an entry'''
+        return os.path.join(self.directory, self.key(par, seed, name))
+
+    def has(self, par, seed, name):
+        '''Whether an entry is in the store'''
+        return os.path.exists(os.path.join(self.path(par, seed, name), 'meta.json'))
+
+    def save(self, par, seed, name, **arrays):
+        '''Save arrays as an entry, replacing an existing entry
+
+        The entry is written to a temporary directory which is then renamed, so other processes never see
+        a half-written entry.
+
+        Args:
+            par: Parameters of the model
+            seed: Seed of the random numbers
+            name: Name of the results
+            **arrays: Arrays to save
+        '''
+        path = self.path(par, seed, name)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        os.makedirs(tmp, exist_ok=True)
+
+        if self.compress:
+            np.savez_compressed(os.path.join(tmp, 'arrays.npz'), **arrays)
+        else:
+            for array_name, array in arrays.items():
+                np.save(os.path.join(tmp, f'{array_name}.npy'), np.asarray(array))
+
+        meta = {'params': self._params(par, seed), 'names': list(arrays), 'compressed': self.compress}
+        with open(os.path.join(tmp, 'meta.json'), 'w') as file:
+            json.dump(meta, file)
+
+        # Replace an existing entry
+        if os.path.exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.replace(tmp, path)
+        except OSError:     # another process saved the same entry in the meantime
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def load(self, par, seed, name, mmap_mode='r'):
+        '''Open an entry
+
+        Args:
+            par: Parameters of the model
+            seed: Seed of the random numbers
+            name: Name of the results
+            mmap_mode: Memory-map mode of the .npy files ('r' is read-only, None reads them into memory)
+
+        Returns:
+            results: Namespace with the arrays, or None if the entry is not in the store
+        '''
+        path = self.path(par, seed, name)
+        try:
+            with open(os.path.join(path, 'meta.json')) as file:
+                meta = json.load(file)
+        except FileNotFoundError:
+            return None
+
+        if meta['compressed']:
+            with np.load(os.path.join(path, 'arrays.npz')) as data:
+                return SimpleNamespace(**{array_name: data[array_name] for array_name in meta['names']})
+
+        return SimpleNamespace(**{array_name: np.load(os.path.join(path, f'{array_name}.npy'), mmap_mode=mmap_mode)
+                                  for array_name in meta['names']})
+
+    def cached(self, par, seed, name, compute, names, mmap_mode='r'):
+        '''Load an entry, computing and saving it first if it is not in the store
+
+        Args:
+            par: Parameters of the model
+            seed: Seed of the random numbers
+            name: Name of the results
+            compute: Function without arguments returning the arrays as a tuple
+            names: Names of the arrays returned by compute
+            mmap_mode: Memory-map mode of the .npy files
+
+        Returns:
+            results: Namespace with the arrays
+        '''
+        results = self.load(par, seed, name, mmap_mode)
+        if results is None:
+            self.save(par, seed, name, **dict(zip(names, compute())))
+            results = self.load(par, seed, name, mmap_mode)
+        return results
+
+    def clear(self):
+        '''Remove all entries'''
+        shutil.rmtree(self.directory, ignore_errors=True)
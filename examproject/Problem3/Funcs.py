@@ -1,11 +1,15 @@
+import itertools
+from types import SimpleNamespace
 import numpy as np
 import scipy  
+from scipy.spatial import cKDTree
 import matplotlib.pyplot as plt
 
 
 
 def f(x):
-    return x[0] * x[1]
+    # Product of the coordinates (x[0]*x[1] in 2-D), for one point or an array of points along the last axis
+    return np.prod(np.asarray(x), axis=-1)
 
 def algorithm1(X, y):
 
@@ -54,3 +58,193 @@ def find_points(X, y):
     return A, B, C, D
 
 
+# d-dimensional version of algorithm1, for many points y at once
+
+def orthant_points(X, Y, tree=None, k=None):
+    '''Nearest point of X in each of the 2^d orthants around each point in Y
+
+    Orthant o contains the points that are larger than y in the coordinates j where bit j of o is set,
+    and smaller in the others (points equal to y in a coordinate are in no orthant, as in find_points).
+    In 2-D the orthants 3, 1, 0 and 2 hold A, B, C and D.
+
+    Args:
+        X: Points, array of shape (n, d)
+        Y: Points to find neighbours of, array of shape (m, d)
+        tree: cKDTree of X (built if None)
+        k: Number of nearest neighbours searched first (doubled for the points missing an orthant)
+
+    Returns:
+        index: Index in X of the nearest point in each orthant, array of shape (m, 2^d), -1 where an orthant is empty
+        found: Mask of the points in Y with a neighbour in every orthant
+    '''
+    X = np.asarray(X, dtype=float)
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    n, d = X.shape
+    tree = cKDTree(X) if tree is None else tree
+    k = min(n, 4*2**d if k is None else k)
+    weights = 2**np.arange(d)
+
+    index = np.full((len(Y), 2**d), -1)
+    pending = np.arange(len(Y))
+    while len(pending) > 0:
+        # Neighbours sorted by distance, and their orthants
+        _, neighbours = tree.query(Y[pending], k=k, workers=-1)
+        neighbours = neighbours.reshape(len(pending), k)
+        diff = X[neighbours] - Y[pending, None, :]
+        orthant = (diff > 0) @ weights
+        orthant[np.any(diff == 0, axis=-1)] = -1
+
+        # The first (nearest) neighbour in each orthant
+        for o in range(2**d):
+            is_o = orthant == o
+            first = np.argmax(is_o, axis=1)
+            has = is_o[np.arange(len(pending)), first]
+            index[pending[has], o] = neighbours[has, first[has]]
+
+        # Search more neighbours for the points missing an orthant, unless all points have been searched
+        if k == n:
+            break
+        pending = pending[np.any(index[pending] < 0, axis=1)]
+        k = min(n, 2*k)
+
+    return index, np.all(index >= 0, axis=1)
+
+
+def simplices(d):
+    '''Simplices splitting the cube of orthants into d! simplices (Freudenthal triangulation)
+
+    Every simplex goes from the orthant below y in all coordinates to the orthant above y in all coordinates,
+    switching one coordinate at a time. In 2-D these are the triangles ABC and CDA.
+
+    Args:
+        d: Number of dimensions
+
+    Returns:
+        simplices: Orthants of the vertices of each simplex, array of shape (d!, d+1)
+    '''
+    out = []
+    for order in itertools.permutations(range(d)):
+        vertex = 0
+        simplex = [vertex]
+        for j in order:
+            vertex += 2**j
+            simplex.append(vertex)
+        out.append(simplex[::-1])       # Ordered as A, B, C in 2-D
+    return np.array(out)
+
+
+def _permutation_rank(perm):
+    '''Position of each row of perm in itertools.permutations order (lexicographic)'''
+    m, d = perm.shape
+    rank = np.zeros(m, dtype=int)
+    for i in range(d-1):
+        smaller_after = np.sum(perm[:, i+1:] < perm[:, i, None], axis=1)
+        rank += smaller_after * np.prod(np.arange(1, d-i))
+    return rank
+
+
+def barycentric_weights(vertices, Y):
+    '''Barycentric coordinates of points with respect to simplices, solved in one batch
+
+    Args:
+        vertices: Vertices of the simplices, array of shape (m, d+1, d)
+        Y: Points, array of shape (m, d)
+
+    Returns:
+        r: Barycentric coordinates, array of shape (m, d+1) (nan for degenerate simplices)
+        valid: Mask of the simplices that are not degenerate
+    '''
+    m, d1, d = vertices.shape
+
+    # Solve sum_i r_i*vertex_i = y and sum_i r_i = 1
+    M = np.ones((m, d1, d1))
+    M[:, :d, :] = np.swapaxes(vertices, 1, 2)
+    b = np.ones((m, d1))
+    b[:, :d] = Y
+
+    scale = np.max(np.abs(M), axis=(1, 2))**d1
+    valid = np.isfinite(M).all(axis=(1, 2)) & (np.abs(np.linalg.det(M)) > 1e-12*scale)
+
+    r = np.full((m, d1), np.nan)
+    if valid.any():
+        r[valid] = np.linalg.solve(M[valid], b[valid][..., None])[..., 0]
+    return r, valid
+
+
+def interpolate(X, F, Y, tree=None):
+    '''Approximate a function at many points from its values at X (algorithm1 in d dimensions)
+
+    For each point y, the nearest point of X in each orthant around y is found, and the simplices between
+    these points are searched for one containing y, by walking between neighbouring simplices and, if the walk
+    fails, by trying all d! simplices in turn. The value is the barycentric average of F over the vertices of the
+    simplex containing y (in 2-D, ABC or CDA).
+
+    Args:
+        X: Points with known values, array of shape (n, d)
+        F: Values at X, array of shape (n,)
+        Y: Points to approximate the function at, array of shape (m, d)
+        tree: cKDTree of X (built if None, pass it to reuse it across calls)
+
+    Returns:
+        result: Namespace with the approximations value (nan where it failed), the masks found (a point in every
+            orthant) and inside (y is in one of the simplices), the index of the simplex, the barycentric
+            coordinates r and the indices in X of the vertices
+    '''
+    X = np.asarray(X, dtype=float)
+    F = np.asarray(F, dtype=float)
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    m, d = Y.shape
+
+    index, found = orthant_points(X, Y, tree)
+    S = simplices(d)
+
+    simplex = np.full(m, -1)
+    r = np.full((m, d+1), np.nan)
+    vertices = np.full((m, d+1), -1)
+
+    def attempt(pending, s):
+        # Try simplex s[i] for the point pending[i], returns whether the points are inside and their coordinates
+        idx = np.take_along_axis(index[pending], S[s], axis=1)
+        r_s, valid = barycentric_weights(X[idx], Y[pending])
+        inside = valid & np.all((r_s >= 0) & (r_s <= 1), axis=1)
+
+        hit = pending[inside]
+        simplex[hit] = s[inside]
+        r[hit] = r_s[inside]
+        vertices[hit] = idx[inside]
+        return inside, r_s
+
+    # 1. Walk from the simplex y would be in if the points were the corners of a box (the coordinates switched in
+    #    the order of the relative position of y between the lowest and the highest point) towards y: when a
+    #    coordinate r_q of an inner vertex is negative, y is on the other side of the facet opposite that vertex,
+    #    and the simplex there has coordinates d-q-1 and d-q switched in the opposite order
+    pending = np.flatnonzero(found)
+    lo, hi = X[index[pending, 0]], X[index[pending, -1]]
+    order = np.argsort(-(Y[pending] - lo)/(hi - lo), axis=1, kind='stable')
+    for _ in range(d*d):
+        if len(pending) == 0:
+            break
+        inside, r_s = attempt(pending, _permutation_rank(order))
+        if d < 2:
+            break
+
+        inner = np.nan_to_num(r_s[:, 1:d], nan=0.0)
+        move = ~inside & (np.min(inner, axis=1) < 0)
+        rows = np.flatnonzero(move)
+        a = d - 2 - np.argmin(inner[rows], axis=1)
+        order[rows, a], order[rows, a+1] = order[rows, a+1], order[rows, a].copy()
+        pending, order = pending[move], order[move]
+
+    # 2. The points the walk did not find a simplex for try all simplices in turn
+    pending = np.flatnonzero(found & (simplex < 0))
+    for s in range(len(S)):
+        if len(pending) == 0:
+            break
+        inside, _ = attempt(pending, np.full(len(pending), s))
+        pending = pending[~inside]
+
+    inside = simplex >= 0
+    value = np.full(m, np.nan)
+    value[inside] = np.sum(r[inside]*F[vertices[inside]], axis=1)
+
+    return SimpleNamespace(value=value, found=found, inside=inside, simplex=simplex, r=r, vertices=vertices)
@@ -1,13 +1,26 @@
 
 from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import time
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # repository folder, for common
+from common.params import Params
+
+
+class ExchangeParams(Params):
+    """Parameters of the exchange economy"""
+    __slots__ = ('alpha', 'beta', 'w1A', 'w2A', 'w1B', 'w2B', 'p2', 'kappa', 'eps', 'maxiter')
+
+
 class ExchangeEconomyClass:
 
     def __init__(self):
         """Initialize the model with parameters"""
 
-        par = self.par = SimpleNamespace()
+        par = self.par = ExchangeParams()
 
         # a. preferences
         par.alpha = 1/3
@@ -28,6 +41,19 @@ class ExchangeEconomyClass:
         par.eps = 1e-8
         par.maxiter = 10000
 
+        # Instrumentation (see instrument)
+        self.stats = None
+
+    def instrument(self, stats):
+        """Attach an object collecting solver statistics
+
+        Args:
+            stats: Object with the methods of common.SolverStats (count, record and timer), or None to disable
+
+        """
+
+        self.stats = stats
+
     def utility_A(self,x1A,x2A):
         """Defines the utility for consumer A
         
@@ -174,16 +200,19 @@ class ExchangeEconomyClass:
 
 
 
-    def find_equilibrium(self, p2, p1_guess):
+    def find_equilibrium(self, p2, p1_guess, do_print = True):
         """Calculates the market equilibrium
 
         Args:
             p1_guess: Arbitrary starting value of price for good 1
+            do_print: If True, the iterations are printed
 
         Returns:
              Iteration over excess demand based on the price of good 1
         """
         par = self.par
+        stats = self.stats
+        start = time.perf_counter()
 
         # Counter:
         t = 0
@@ -199,13 +228,14 @@ class ExchangeEconomyClass:
             
             # 2. check stop?
             if  np.abs(Z1) < par.eps or t >= par.maxiter:   # The first condition compares to the tolerance level and the second condition ensures that the loop does not go to infinity
-                print(f'{t:3d}: p1 = {p1:12.8f} -> excess demand -> {Z1:14.8f}')
+                if do_print:
+                    print(f'{t:3d}: p1 = {p1:12.8f} -> excess demand -> {Z1:14.8f}')
                 break    
             
             # 3. Print the first 5 and every 25th iteration using the modulus operator 
-            if t < 5 or t%25 == 0:
+            if do_print and (t < 5 or t%25 == 0):
                 print(f'{t:3d}: p1 = {p1:12.8f} -> excess demand -> {Z1:14.8f}')
-            elif t == 5:
+            elif do_print and t == 5:
                 print('   ...')
             
             # 4. update p1
@@ -214,6 +244,11 @@ class ExchangeEconomyClass:
             # 5. update counter and return to step 1
             t += 1    
 
+        # Store solver statistics (one excess demand evaluation per iteration)
+        if stats is not None:
+            stats.count('find_equilibrium.excess_demand', t+1)
+            stats.count('find_equilibrium.iterations', t)
+            stats.record('find_equilibrium', time.perf_counter() - start)
 
         # Check if solution is found 
         if np.abs(Z1) < par.eps:
@@ -233,6 +268,71 @@ class ExchangeEconomyClass:
             print('Solution was not found')
 
 
+    def sweep(self, alpha = None, beta = None, w1A = None, w2A = None, grid = True, chunk_size = 1_000_000, workers = None):
+        """Equilibria for many preferences and endowments at once
+
+        Uses the closed form of the equilibrium price, p1 = p2*(alpha*w2A + beta*w2B)/(1 - alpha*w1A - beta*w1B),
+        so no iterations are needed. The points are computed in chunks on a pool of threads (NumPy releases
+        the GIL in the array operations).
+
+        Args:
+            alpha, beta: Preference parameters (par.alpha and par.beta if None)
+            w1A, w2A: Endowments of consumer A (par.w1A and par.w2A if None), B gets the rest
+            grid: If True, the inputs are 1-D axes of a grid; if False, they are broadcast against each other
+            chunk_size: Number of points computed per task
+            workers: Number of threads (the number of cores if None)
+
+        Returns:
+            sol: Namespace with the dims and coords of the result and the arrays p1, x1A, x2A, x1B, x2B, u_A and u_B
+        """
+        par = self.par
+        dims = ('alpha', 'beta', 'w1A', 'w2A')
+        values = [par.alpha if alpha is None else alpha, par.beta if beta is None else beta,
+                  par.w1A if w1A is None else w1A, par.w2A if w2A is None else w2A]
+        values = [np.asarray(value, dtype=float) for value in values]
+
+        # 1. shape of the result
+        if grid:
+            coords = {dim: np.atleast_1d(value) for dim, value in zip(dims, values)}
+            inputs = [coords[dim].reshape([-1 if i == j else 1 for j in range(4)]) for i, dim in enumerate(dims)]
+        else:
+            coords = {dim: value for dim, value in zip(dims, values)}
+            inputs = values
+        shape = np.broadcast_shapes(*[value.shape for value in inputs])
+        inputs = [np.broadcast_to(value, shape) for value in inputs]
+        size = int(np.prod(shape))
+
+        names = ['p1', 'x1A', 'x2A', 'x1B', 'x2B', 'u_A', 'u_B']
+        out = {name: np.empty(size) for name in names}
+
+        # 2. compute a chunk of points
+        def solve_chunk(start):
+            stop = min(start + chunk_size, size)
+            index = np.unravel_index(np.arange(start, stop), shape)
+            a, b, w1, w2 = [value[index] for value in inputs]
+
+            p1 = par.p2*(a*w2 + b*(1-w2))/(1 - a*w1 - b*(1-w1))
+            income_A = p1*w1 + par.p2*w2
+            income_B = p1*(1-w1) + par.p2*(1-w2)
+            x1A = a*income_A/p1
+            x2A = (1-a)*income_A/par.p2
+            x1B = b*income_B/p1
+            x2B = (1-b)*income_B/par.p2
+
+            for name, value in zip(names, [p1, x1A, x2A, x1B, x2B, x1A**a * x2A**(1-a), x1B**b * x2B**(1-b)]):
+                out[name][start:stop] = value
+
+        # 3. spread the chunks over the cores
+        starts = range(0, size, chunk_size)
+        if len(starts) == 1:
+            solve_chunk(0)
+        else:
+            with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                list(pool.map(solve_chunk, starts))
+
+        return SimpleNamespace(dims=dims if grid else None, coords=coords, **{name: value.reshape(shape) for name, value in out.items()})
+
+
     def print_solution(self):
         """Prints the solution to exchange economy
         
@@ -1,21 +1,88 @@
 from scipy import optimize
 from types import SimpleNamespace
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import sys
+import time
 import numpy as np
 import sympy as sm
+from sympy.printing.numpy import NumPyPrinter
 from IPython.display import display 
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))  # repository folder, for common
+from common.params import Params
 
-def analytical(ext1 = False, ext2 = False, do_print = False):
+
+def _shares(par, ext1 = False, ext2 = False):
     """
-    Use sympy to solve the model.
+    Land and oil shares used by the extension of the model
 
     Args:
+        par: Parameters
         ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
-        do_print (bool): If True, the solution is printed.
-    
+
     Returns:
-        z_sol: The solution to the model.
+        kappa: Land share (0 in the basic model)
+        epsilon: Oil share (0 unless the model with land and oil is used)
+    """
+    if ext1:
+        return par.kappa, 0
+    elif ext2:
+        return par.kappa, par.epsilon
+    else:
+        return 0, 0
+
+
+def _exogenous(par, T, ext1 = False, ext2 = False):
+    """
+    Closed-form exogenous paths of the model
+
+    Args:
+        par: Parameters as 1-D arrays of length P (see Solow.par_arrays)
+        T: Number of periods
+        ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
+
+    Returns:
+        t: Time index
+        L, A, R, E: Labor, technology, oil and consumption of oil, arrays of shape (T+1, P)
+        B: Everything in the production function except capital, i.e. Y = K**alpha * B
+    """
+    kappa, epsilon = _shares(par, ext1, ext2)
+
+    t = np.arange(T+1)
+    L = par.L0 * (1+par.n)**t[:, None]      # Labor
+    A = par.A0 * (1+par.g)**t[:, None]      # Technology
+    R = par.R0 * (1-par.s_E)**t[:, None]    # Oil
+    E = par.s_E * R                         # Consumption of oil
+
+    # Everything in the production function except capital
+    B = (A*L)**(1-par.alpha-kappa-epsilon) * par.X**kappa * E**epsilon
+
+    return t, L, A, R, E, B
+
+
+# Order of the arguments of the compiled steady state evaluators
+SS_ARGS = ('alpha', 'kappa', 'epsilon', 's_Y', 's_E', 'delta', 'g', 'n')
+
+# Cache of the analytical steady states, in memory and on disk
+SS_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__sscache__')
+_ss_cache = {}      # Extension -> namespace with the solution and its evaluator
+_evaluators = {}    # Sympy expression -> compiled NumPy evaluator
+
+
+def _transition(ext1 = False, ext2 = False):
+    """
+    Transition equation for the capital-output ratio
+
+    Args:
+        ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
+
+    Returns:
+        z: The symbol for the capital-output ratio
+        transition: The transition equation
     """
     # Define symbols
     z = sm.symbols('z')
@@ -40,8 +107,197 @@ def analytical(ext1 = False, ext2 = False, do_print = False):
     denominator = (((1+g) * (1+n))**(1 - alpha - kappa - epsilon) * (1-s_E)**epsilon)**(1/(1-alpha))
     transition = sm.Eq(z, (1/denominator) *(s_Y + (1-delta)*z))
 
+    return z, transition
+
+
+def _compile(expr):
+    """
+    Compile sympy expressions in the steady state parameters to a vectorized NumPy function
+
+    Args:
+        expr: Sympy expression in (a subset of) SS_ARGS, or a list of such expressions
+
+    Returns:
+        code: The generated NumPy code
+        func: Function of SS_ARGS (in that order) evaluating the expression (a tuple of values for a list)
+    """
+    printer = NumPyPrinter()
+    exprs = expr if isinstance(expr, list) else [expr]
+
+    # Common subexpressions are computed once
+    replacements, reduced = sm.cse(exprs)
+    lines = [f'def _f({", ".join(SS_ARGS)}):']
+    lines += [f'    {symbol} = {printer.doprint(value)}' for symbol, value in replacements]
+    values = [printer.doprint(value) for value in reduced]
+    lines += [f'    return ({", ".join(values)},)' if isinstance(expr, list) else f'    return {values[0]}']
+    code = '\n'.join(lines)
+
+    return code, _load(code)
+
+
+def _load(code):
+    """
+    Load a function generated by _compile
+
+    Args:
+        code: The generated NumPy code
+
+    Returns:
+        func: The compiled function
+    """
+    namespace = {'numpy': np}
+    exec(code, namespace)
+
+    return namespace['_f']
+
+
+def _read_cache(name, equation):
+    """
+    Read an entry of the disk cache
+
+    Args:
+        name: Name of the entry
+        equation: String identifying the derivation, the entry is only used if it was stored with the same string
+
+    Returns:
+        stored: The stored entry, or None if it is missing or outdated
+    """
+    path = os.path.join(SS_CACHE_DIR, f'{name}-sympy{sm.__version__}.json')
+    try:
+        with open(path) as file:
+            stored = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    return stored if stored.get('equation') == equation else None
+
+
+def _write_cache(name, stored):
+    """
+    Write an entry of the disk cache
+
+    Args:
+        name: Name of the entry
+        stored: Dictionary to store, including the string identifying the derivation under 'equation'
+
+    Returns:
+        None
+    """
+    path = os.path.join(SS_CACHE_DIR, f'{name}-sympy{sm.__version__}.json')
+
+    # Write to a temporary file first so concurrent processes never read a partial file
+    try:
+        os.makedirs(SS_CACHE_DIR, exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as file:
+            json.dump(stored, file)
+        os.replace(tmp, path)
+    except OSError:
+        pass    # The cache is an optimization, so a read-only location is not an error
+
+
+def _cached_ss(ext1 = False, ext2 = False):
+    """
+    Analytical steady state from the cache, solving and storing it on a miss
+
+    The disk cache is keyed by the extension and the sympy version, and is invalidated when the transition equation changes.
+
+    Args:
+        ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
+
+    Returns:
+        entry: Namespace with the solution z_sol and the compiled evaluator
+    """
+    key = 'oil' if ext2 and not ext1 else 'land' if ext1 else 'base'
+    if key in _ss_cache:
+        return _ss_cache[key]
+
+    z, transition = _transition(ext1, ext2)
+    equation = sm.srepr(transition)
+
+    # Load from disk if the stored derivation matches the current transition equation
+    stored = _read_cache(key, equation)
+    if stored is not None:
+        z_sol = eval(stored['solution'], vars(sm))
+        func = _load(stored['code'])
+    else:
+        z_sol = sm.solve(transition, z)[0]
+        code, func = _compile(z_sol)
+        _write_cache(key, {'equation': equation, 'solution': sm.srepr(z_sol), 'code': code})
+
+    entry = _ss_cache[key] = SimpleNamespace(key=key, z_sol=z_sol, evaluator=func, derivatives={})
+    _evaluators[z_sol] = func
+
+    return entry
+
+
+def _cached_derivatives(ext1 = False, ext2 = False, order = 1):
+    """
+    Compiled derivatives of the analytical steady state with respect to all parameters in SS_ARGS
+
+    Args:
+        ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
+        order: 1 for the gradient and 2 for the Hessian
+
+    Returns:
+        func: Function of SS_ARGS returning a tuple with the len(SS_ARGS)**order derivatives (row-major for the Hessian)
+    """
+    entry = _cached_ss(ext1, ext2)
+    if order in entry.derivatives:
+        return entry.derivatives[order]
+
+    name = f'{entry.key}-d{order}'
+    equation = sm.srepr(entry.z_sol)
+
+    stored = _read_cache(name, equation)
+    if stored is not None:
+        func = _load(stored['code'])
+    else:
+        symbols = sm.symbols(SS_ARGS)
+        if order == 1:
+            derivatives = [sm.diff(entry.z_sol, x) for x in symbols]
+        else:
+            derivatives = [sm.diff(entry.z_sol, x, y) for x in symbols for y in symbols]
+        code, func = _compile(derivatives)
+        _write_cache(name, {'equation': equation, 'code': code})
+
+    entry.derivatives[order] = func
+
+    return func
+
+
+def clear_ss_cache():
+    """
+    Clear the cached analytical steady states in memory and on disk
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    _ss_cache.clear()
+    _evaluators.clear()
+    if os.path.isdir(SS_CACHE_DIR):
+        for name in os.listdir(SS_CACHE_DIR):
+            os.remove(os.path.join(SS_CACHE_DIR, name))
+
+
+def analytical(ext1 = False, ext2 = False, do_print = False):
+    """
+    Use sympy to solve the model. The solution is cached (see _cached_ss), so only the first call solves the model.
+
+    Args:
+        ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
+        do_print (bool): If True, the solution is printed.
+    
+    Returns:
+        z_sol: The solution to the model.
+    """
+    z = sm.symbols('z')
+
     # Solve equation
-    z_sol = sm.solve(transition, z)[0]
+    z_sol = _cached_ss(ext1, ext2).z_sol
 
     # Print solution
     if do_print == True:
@@ -57,6 +313,11 @@ def analytical(ext1 = False, ext2 = False, do_print = False):
 
 
 
+class SolowParams(Params):
+    """Parameters of the Solow model (see Solow.setup)"""
+    __slots__ = ('alpha', 'kappa', 'epsilon', 'g', 's_E', 'n', 's_Y', 'delta', 'K0', 'L0', 'A0', 'R0', 'X')
+
+
 class Solow:
 
     def __init__(self):
@@ -70,8 +331,37 @@ class Solow:
             None
         """
 
-        self.par = SimpleNamespace()    # Parameters
+        self.par = SolowParams()        # Parameters
         self.sim = SimpleNamespace()    # Simulation results
+        self._checkpoints = {}          # Baseline paths used by simulate_scenarios
+        self.stats = None               # Solver statistics (see instrument)
+
+    def instrument(self, stats):
+        """
+        Attach an object collecting solver statistics
+
+        The restarts of calibrate run in other processes and do not report to stats, only the total time and
+        number of evaluations recorded after collecting their results are included.
+
+        Args:
+            stats: Object with the methods of common.SolverStats (count, record and timer), or None to disable
+
+        Returns:
+            None
+        """
+        self.stats = stats
+
+    def _timer(self, name):
+        """
+        Timer of a solver call if the instrumentation is enabled
+
+        Args:
+            name: Name of the solver call
+
+        Returns:
+            timer: Context manager timing the call (doing nothing if the instrumentation is disabled)
+        """
+        return self.stats.timer(name) if self.stats is not None else nullcontext()
 
     def setup(self):
         """
@@ -123,28 +413,10 @@ class Solow:
 
         par = self.par  # Parameters
 
-
-
-        # Define extensions
-        if ext1:
-            kappa = sm.symbols('kappa')
-            epsilon = 0
-        elif ext2:
-            kappa = sm.symbols('kappa')
-            epsilon = sm.symbols('epsilon')
-        
-        # Sympy
-        alpha = sm.symbols('alpha')
-        kappa = sm.symbols('kappa')
-        epsilon = sm.symbols('epsilon')
-        g = sm.symbols('g')
-        n = sm.symbols('n')
-        s_Y = sm.symbols('s_Y')
-        s_E = sm.symbols('s_E')
-        delta = sm.symbols('delta')
-
-        # Lamdify equation
-        eq = sm.lambdify((alpha, kappa, epsilon, s_Y, s_E, delta, g, n), ss)
+        # Compiled evaluator, cached per expression
+        if ss not in _evaluators:
+            _evaluators[ss] = _compile(ss)[1]
+        eq = _evaluators[ss]
 
         # Evaluate
         sol = eq(par.alpha, par.kappa, par.epsilon, par.s_Y, par.s_E, par.delta, par.g, par.n)
@@ -158,6 +430,50 @@ class Solow:
 
 
 
+    def ss_sensitivity(self, ext1 = False, ext2 = False, hessian = False, do_print = False, **params):
+        """
+        Sensitivity of the analytical steady state to the parameters
+
+        The symbolic gradient (and Hessian) of z with respect to the parameters in SS_ARGS is derived once, compiled to
+        NumPy and cached like the steady state itself, so a whole grid of parameter sets is evaluated in one call.
+
+        Args:
+            ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
+            hessian: If True, the Hessian is computed as well
+            do_print: If True, the elasticities are printed (for the first parameter set)
+            **params: Parameters to override, scalars or arrays of length P (see par_arrays)
+
+        Returns:
+            sens: Namespace with the parameter names, the steady state z of shape (P,), the gradient and the elasticities
+                of shape (P, 8) and, if hessian is True, the Hessian of shape (P, 8, 8)
+        """
+        par = self.par_arrays(**params)
+        args = [getattr(par, name) for name in SS_ARGS]
+        P = args[0].size
+
+        # Steady state and gradient (z is broadcast along so that constant derivatives get the shape (P,))
+        z = np.broadcast_to(_cached_ss(ext1, ext2).evaluator(*args), (P,))
+        gradient = np.stack(np.broadcast_arrays(*_cached_derivatives(ext1, ext2, 1)(*args), z), axis=-1)[:, :-1]
+
+        # Elasticities, d log z / d log parameter
+        with np.errstate(divide='ignore', invalid='ignore'):
+            elasticity = gradient * np.stack(args, axis=-1) / z[:, None]
+
+        sens = SimpleNamespace(names=SS_ARGS, z=z, gradient=gradient, elasticity=elasticity)
+
+        if hessian:
+            k = len(SS_ARGS)
+            second = np.stack(np.broadcast_arrays(*_cached_derivatives(ext1, ext2, 2)(*args), z), axis=-1)[:, :-1]
+            sens.hessian = second.reshape(P, k, k)
+
+        # Print
+        if do_print:
+            for name, value in zip(SS_ARGS, elasticity[0]):
+                print(f'Elasticity of z with respect to {name}: {value:.4f}')
+
+        return sens
+
+
     def solve_ss(self, method='brentq', ext1 = False, ext2 = False, do_print = False):
         """
         Solve the model numerically
@@ -189,6 +505,7 @@ class Solow:
         obj = lambda z: (1/denominator)*(par.s_Y + (1-par.delta)*z)**(1-par.alpha)*z**par.alpha - z
 
         # Solve the model numerically
+        start = time.perf_counter()
         if method == 'bisect':
             result = optimize.root_scalar(obj, bracket=[0.1, 100], method='bisect')
         elif method == 'brentq':
@@ -196,6 +513,10 @@ class Solow:
         else:
             raise ValueError('method must be either bisect or brentq')
 
+        if self.stats is not None:
+            self.stats.record(f'solve_ss.{method}', time.perf_counter() - start)
+            self.stats.count(f'solve_ss.{method}.function_calls', result.function_calls)
+
         # Print results
         if do_print:
             print(f'The numerical steady state using {method}')
@@ -204,35 +525,130 @@ class Solow:
         return result
 
 
-    def graph(self, periods = 100, ext1 = False, ext2 = False, do_print = False, shock_period = 0, shock_size = 0):
+    def solve_ss_batch(self, method = 'newton', ext1 = False, ext2 = False, bracket = (0.1, 100), tol = 1e-12, maxiter = 100, do_print = False, **params):
         """
-        Graph the model
+        Solve the model numerically for many parameter sets at once
+
+        The objective is the same as in solve_ss, but every iteration updates all parameter sets in one array operation.
+        A bracket is found for each parameter set by expanding the upper bound, and parameter sets without a bracket are
+        marked as not converged.
+
+        Args:
+            method: Method for solving the model - either bisect or newton (Newton steps safeguarded by bisection)
+            ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
+            bracket: Initial bracket for the root
+            tol: Tolerance on the width of the bracket (bisect) or the size of the step (newton)
+            maxiter: Maximum number of iterations
+            do_print: If True, the number of converged parameter sets is printed
+            **params: Parameters to override, scalars or arrays of length P (see par_arrays)
+
+        Returns:
+            result: Namespace with the roots, a convergence mask and the number of iterations
+        """
+        if method not in ['bisect', 'newton']:
+            raise ValueError('method must be either bisect or newton')
+
+        par = self.par_arrays(**params)
+        kappa, epsilon = _shares(par, ext1, ext2)
+
+        # Objective function and its derivative
+        c = 1/(((1+par.g) * (1+par.n))**(1 - par.alpha - kappa - epsilon) * (1-par.s_E)**epsilon)
+        a = par.alpha
+        def obj(z):
+            return c*(par.s_Y + (1-par.delta)*z)**(1-a)*z**a - z
+        def grad(z):
+            x = par.s_Y + (1-par.delta)*z
+            return c*((1-a)*(1-par.delta)*x**(-a)*z**a + a*x**(1-a)*z**(a-1)) - 1
+
+        # Detect brackets, expanding the upper bound where the sign does not change
+        lo = np.full(a.size, float(bracket[0]))
+        hi = np.full(a.size, float(bracket[1]))
+        f_lo = obj(lo)
+        f_hi = obj(hi)
+        for _ in range(10):
+            expand = np.sign(f_lo) == np.sign(f_hi)
+            if not expand.any():
+                break
+            hi = np.where(expand, 10*hi, hi)
+            f_hi = np.where(expand, obj(hi), f_hi)
+        bracketed = np.sign(f_lo) != np.sign(f_hi)
+
+        # Iterate on all parameter sets at once
+        z = 0.5*(lo + hi)
+        converged = np.zeros(a.size, dtype=bool)
+        for it in range(1, maxiter+1):
+            f = obj(z)
+
+            # Shrink the bracket
+            left = np.sign(f) == np.sign(f_lo)
+            lo = np.where(left, z, lo)
+            f_lo = np.where(left, f, f_lo)
+            hi = np.where(left, hi, z)
+
+            # Newton step, falling back to bisection when it leaves the bracket
+            z_mid = 0.5*(lo + hi)
+            if method == 'newton':
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    z_new = z - f/grad(z)
+                inside = (z_new > lo) & (z_new < hi)
+                z_new = np.where(inside, z_new, z_mid)
+            else:
+                z_new = z_mid
+
+            step = np.abs(z_new - z) if method == 'newton' else hi - lo
+            converged = bracketed & ((step < tol*np.maximum(1, np.abs(z))) | (f == 0))
+            z = np.where(converged, z, z_new)
+            if converged[bracketed].all():
+                break
+
+        root = np.where(bracketed, z, np.nan)
+        result = SimpleNamespace(root=root, converged=converged, bracketed=bracketed, f_root=obj(root), iterations=it)
+
+        if self.stats is not None:
+            self.stats.count(f'solve_ss_batch.{method}.iterations', it)
+            self.stats.count(f'solve_ss_batch.{method}.parameter_sets', a.size)
+
+        # Print results
+        if do_print:
+            print(f'The numerical steady state using vectorized {method}')
+            print(f'{converged.sum()} of {converged.size} parameter sets converged in {it} iterations')
+
+        return result
+
+
+    def par_arrays(self, **params):
+        """
+        Broadcast the parameters to 1-D arrays with a common length
+
+        Args:
+            **params: Parameters to override, e.g. s_Y = np.linspace(0.1, 0.3, 50). Scalars and arrays are broadcast against each other.
+
+        Returns:
+            par: SolowParams with every parameter as a 1-D array of length P (the number of parameter sets)
+        """
+        return self.par.as_arrays(**params)
+
+
+    def simulate(self, periods = 100, ext1 = False, ext2 = False, shock_period = 0, shock_size = 0, **params):
+        """
+        Simulate the model for one or many parameter sets without plotting
+
+        Labor, technology, oil and oil consumption follow closed-form geometric paths and are computed in one step.
+        Only the capital accumulation is iterated, and it is iterated for all parameter sets at once.
 
         Args:
             periods: Number of periods to simulate
             ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
-            do_print: If True, the solution is printed
-            shock_period: Period of shock (set to 0 as default)
+            shock_period: Period of shock (set to 0 as default). The capital is destroyed after output in that period is produced.
             shock_size: Amount of capital destroyed (set to 0 as default)
+            **params: Parameters to override, scalars or arrays of length P (see par_arrays)
         
         Returns:
-            if do_print is True, the solution is printed
+            sim: Namespace with K, L, A, R, Y, E and z as arrays of shape (P, periods+1) and the time index t
         """
-        par = self.par  # Parameters
-        sim = self.sim  # Simulation results
+        par = self.par_arrays(**params)
         T = periods
 
-        # Define extensions
-        if ext1:
-            kappa = par.kappa
-            epsilon = 0
-        elif ext2:
-            kappa = par.kappa
-            epsilon = par.epsilon
-        else:
-            kappa = 0
-            epsilon = 0
-        
         # Check shock is within maximum amount of periods and not negative
         if shock_period < 0:
             raise ValueError('Shock period must be positive')
@@ -240,57 +656,407 @@ class Solow:
             shock_period = 0
             shock_size = 0
 
-        # Find steady state
-        ss = self.solve_ss(method='brentq', ext1=ext1, ext2=ext2).root
+        # Exogenous paths, time along the first axis and parameter sets along the second
+        t, L, A, R, E, B = _exogenous(par, T, ext1, ext2)
 
-        
-        if ss < 0:
-            message = 'The steady state is negative'
+        # Capital accumulation
+        start = time.perf_counter()
+        K = np.empty_like(B)
+        Y = np.empty_like(B)
+        K[0] = par.K0
+        Y[0] = K[0]**par.alpha * B[0]
+        for s in range(T+1):
+            if s == shock_period:
+                z_shock = K[s]/Y[s]     # Capital-output ratio in the shock period is measured before the shock
+                K[s] = K[s]*(1-shock_size)    # Shock is relative amout of capital destroyed, and thus we subtract it from 1
+            if s < T:
+                K[s+1] = par.s_Y * Y[s] + (1-par.delta)*K[s]
+                Y[s+1] = K[s+1]**par.alpha * B[s+1]
+
+        # Capital-output ratio
+        z = K/Y
+        z[shock_period] = z_shock
+
+        if self.stats is not None:
+            self.stats.record('simulate.capital', time.perf_counter() - start)
+            self.stats.count('simulate.periods', T*K.shape[1])
+
+        return SimpleNamespace(t=t, K=K.T, L=L.T, A=A.T, R=R.T, Y=Y.T, E=E.T, z=z.T)
+
+
+    def simulate_scenarios(self, scenarios, periods = 100, ext1 = False, ext2 = False):
+        """
+        Simulate many shock scenarios against one shared baseline
+
+        The baseline path without shocks is simulated once and kept as a checkpoint (per parameters, periods and extension).
+        A scenario is only re-simulated from its first shock onward, and all scenarios are simulated at once, with the
+        scenarios sorted by their first shock so each period only updates the scenarios that have deviated from the baseline.
+        Shocks work as in simulate, so [(shock_period, shock_size)] gives the same path as simulate.
+
+        Args:
+            scenarios: List of shock schedules, each a list of (shock_period, shock_size) pairs. Shocks after periods are ignored.
+            periods: Number of periods to simulate
+            ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
+
+        Returns:
+            sim: Namespace with K, Y and z as arrays of shape (len(scenarios), periods+1), the shared exogenous paths L, A, R
+                and E, the baseline and the time index t
+        """
+        T = periods
+        S = len(scenarios)
+
+        # Baseline checkpoint
+        key = (T, bool(ext1), bool(ext2), self.par.fingerprint())
+        if key not in self._checkpoints:
+            par = self.par_arrays()
+            t, L, A, R, E, B = _exogenous(par, T, ext1, ext2)
+            base = self.simulate(periods=T, ext1=ext1, ext2=ext2)
+            self._checkpoints[key] = SimpleNamespace(par=par, t=t, B=B[:, 0], L=L[:, 0], A=A[:, 0], R=R[:, 0], E=E[:, 0], K=base.K[0], Y=base.Y[0], z=base.z[0])
+        base = self._checkpoints[key]
+        par = base.par
+
+        # Share of capital left after the shocks, and the first shock of each scenario
+        factor = np.ones((T+1, S))
+        first = np.full(S, T+1)
+        for i, schedule in enumerate(scenarios):
+            for shock_period, shock_size in schedule:
+                if shock_period < 0:
+                    raise ValueError('Shock period must be positive')
+                if shock_period <= T:
+                    factor[shock_period, i] *= 1-shock_size
+                    first[i] = min(first[i], shock_period)
+
+        # Sort scenarios by their first shock
+        order = np.argsort(first, kind='stable')
+        first = first[order]
+        factor = factor[:, order]
+
+        # Start all scenarios from the baseline
+        K = np.repeat(base.K[:, None], S, axis=1)
+        Y = np.repeat(base.Y[:, None], S, axis=1)
+        z = np.repeat(base.z[:, None], S, axis=1)
+
+        # Re-simulate from the first shock onward
+        for s in range(first[0] if S > 0 else T+1, T+1):
+            a = np.searchsorted(first, s, side='right')     # Scenarios with a shock in or before period s
+            z[s, :a] = K[s, :a]/Y[s, :a]    # Capital-output ratio in the shock period is measured before the shock
+            K[s, :a] = K[s, :a]*factor[s, :a]
+            if s < T:
+                K[s+1, :a] = par.s_Y * Y[s, :a] + (1-par.delta)*K[s, :a]
+                Y[s+1, :a] = K[s+1, :a]**par.alpha * base.B[s+1]
+
+        # Undo the sorting
+        inverse = np.empty(S, dtype=int)
+        inverse[order] = np.arange(S)
+
+        return SimpleNamespace(t=base.t, K=K[:, inverse].T, Y=Y[:, inverse].T, z=z[:, inverse].T, L=base.L, A=base.A, R=base.R, E=base.E, baseline=base)
+
+
+    def simulate_stochastic(self, periods = 100, paths = 1000, ext1 = False, ext2 = False, sigma_A = 0.01, sigma_L = 0.0, sigma_E = 0.0, seed = 2024, chunk_size = 1000, out_dir = None):
+        """
+        Simulate many stochastic paths of the model
+
+        Technology and labor grow at (1+g) and (1+n) times a mean-one log-normal shock, and the extraction rate of oil is
+        s_E times a mean-one log-normal shock (capped at 1). Every path has its own random stream spawned from seed, so a
+        path is the same regardless of the number of paths and the chunk size. Paths are simulated in chunks, vectorized
+        over the paths in a chunk.
+
+        Args:
+            periods: Number of periods to simulate
+            paths: Number of paths
+            ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
+            sigma_A: Standard deviation of the technology shocks
+            sigma_L: Standard deviation of the population shocks
+            sigma_E: Standard deviation of the extraction shocks
+            seed: Seed for the random streams
+            chunk_size: Number of paths simulated at a time
+            out_dir: If given, the results are written to memory-mapped .npy files in this directory instead of memory
+
+        Returns:
+            sim: Namespace with K, L, A, R, Y, E and z as arrays of shape (paths, periods+1) and the time index t
+        """
+        par = self.par
+        T = periods
+        kappa, epsilon = _shares(par, ext1, ext2)
+        names = ['K', 'L', 'A', 'R', 'Y', 'E', 'z']
+
+        # Containers for results, either in memory or on disk
+        if out_dir is None:
+            sim = SimpleNamespace(**{name: np.empty((paths, T+1)) for name in names})
         else:
-            message = ''
-
-        # Create empty arrays to store results
-        sim.K = np.empty(T+1)   # Capital
-        sim.L = np.empty(T+1)   # Labor
-        sim.A = np.empty(T+1)   # Technology
-        sim.R = np.empty(T+1)   # Oil
-        sim.Y = np.empty(T+1)   # Output
-        sim.E = np.empty(T+1)   # Consumption of oil
-        sim.z = np.empty(T+1)   # Capital-output ratio
-        sim.t = np.linspace(0, T+1, T+1)    # Time
+            os.makedirs(out_dir, exist_ok=True)
+            sim = SimpleNamespace(**{name: np.lib.format.open_memmap(os.path.join(out_dir, f'{name}.npy'), mode='w+', dtype=float, shape=(paths, T+1)) for name in names})
+        sim.t = np.arange(T+1)
 
-        # Initial values
-        sim.K[0] = par.K0 
-        sim.L[0] = par.L0   
-        sim.A[0] = par.A0
-        sim.R[0] = par.R0
-        sim.E[0] = par.s_E * sim.R[0]
-        sim.Y[0] = sim.K[0]**par.alpha * (sim.A[0]*sim.L[0])**(1-par.alpha-kappa-epsilon) * par.X**kappa * sim.E[0]**epsilon
-        sim.z[0] = sim.K[0]/sim.Y[0]
-
-        # Simulate up till shock
-        for t in range(shock_period):
-            sim.K[t+1] = par.s_Y * sim.Y[t] + (1-par.delta)*sim.K[t]
-            sim.R[t+1] = (1-par.s_E)*sim.R[t]
-            sim.L[t+1] = (1+par.n)*sim.L[t]
-            sim.A[t+1] = (1+par.g)*sim.A[t]
-            sim.E[t+1] = par.s_E * sim.R[t+1]
-            sim.Y[t+1] = sim.K[t+1]**par.alpha * (sim.A[t+1]*sim.L[t+1])**(1-par.alpha-kappa-epsilon) * par.X**kappa * sim.E[t+1]**epsilon 
-            sim.z[t+1] = sim.K[t+1]/sim.Y[t+1]
-        
-        # Store shock
-        sim.K[shock_period] = sim.K[shock_period]*(1-shock_size)    # Shock is relative amout of capital destroyed, and thus we subtract it from 1
+        # One random stream per path
+        streams = np.random.SeedSequence(seed).spawn(paths)
+
+        for start in range(0, paths, chunk_size):
+            stop = min(start + chunk_size, paths)
+
+            # Shocks with time along the first axis and paths along the second
+            shocks = np.stack([np.random.default_rng(stream).standard_normal((3, T+1)) for stream in streams[start:stop]], axis=-1)
+            eps_A, eps_L, eps_E = shocks
+            eps_A[0] = 0
+            eps_L[0] = 0
+
+            # Exogenous paths
+            t = sim.t[:, None]
+            A = par.A0 * np.exp(t*np.log(1+par.g) + np.cumsum(sigma_A*eps_A - (t > 0)*sigma_A**2/2, axis=0))    # Technology
+            L = par.L0 * np.exp(t*np.log(1+par.n) + np.cumsum(sigma_L*eps_L - (t > 0)*sigma_L**2/2, axis=0))    # Labor
+            s_E = np.minimum(par.s_E * np.exp(sigma_E*eps_E - sigma_E**2/2), 1)     # Extraction rate
+            R = np.empty_like(s_E)      # Oil
+            R[0] = par.R0
+            R[1:] = par.R0 * np.cumprod(1-s_E[:-1], axis=0)
+            E = s_E * R     # Consumption of oil
+
+            # Everything in the production function except capital
+            B = (A*L)**(1-par.alpha-kappa-epsilon) * par.X**kappa * E**epsilon
+
+            # Capital accumulation
+            K = np.empty_like(B)
+            Y = np.empty_like(B)
+            K[0] = par.K0
+            Y[0] = K[0]**par.alpha * B[0]
+            for s in range(T):
+                K[s+1] = par.s_Y * Y[s] + (1-par.delta)*K[s]
+                Y[s+1] = K[s+1]**par.alpha * B[s+1]
+
+            # Store the chunk
+            for name, value in zip(names, [K, L, A, R, Y, E, K/Y]):
+                getattr(sim, name)[start:stop] = value.T
+
+        if out_dir is not None:
+            for name in names:
+                getattr(sim, name).flush()
+
+        return sim
+
+
+    def simulate_blocks(self, periods = 10**6, ext1 = False, ext2 = False, block_size = 100000, **params):
+        """
+        Simulate the model over a long horizon in logs, yielding the paths in blocks
+
+        The levels of labor, technology and output grow without bound and overflow float64 over tens of thousands of
+        periods, so the paths are kept in logs. Everything in the production function except capital, B, grows at the
+        constant log rate b = (1-alpha-kappa-epsilon)*(log(1+g) + log(1+n)) + epsilon*log(1-s_E), so only the
+        capital-output ratio is iterated,
+
+            z[t+1] = (s_Y + (1-delta)*z[t])**(1-alpha) * z[t]**alpha * exp(-b),
+
+        which stays bounded, and log K = (log z + log B)/(1-alpha) and log Y = log K - log z follow from it.
+        Once z is at a fixed point (in floating point) for all parameter sets, the remaining periods are filled
+        without iterating. Memory use only depends on block_size and the number of parameter sets.
+
+        Args:
+            periods: Number of periods to simulate
+            ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
+            block_size: Number of periods in each block
+            **params: Parameters to override, scalars or arrays of length P (see par_arrays)
+
+        Yields:
+            block: Namespace with the time index t of the block and log_K, log_L, log_A, log_R, log_Y, log_E, z and the
+                log capital and output per effective worker, log_k and log_y, as arrays of shape (P, len(t))
+        """
+        par = self.par_arrays(**params)
+        kappa, epsilon = _shares(par, ext1, ext2)
+        T = periods
+        beta = 1 - par.alpha - kappa - epsilon
+
+        # Logs of the exogenous variables in period 0 and their growth rates
+        with np.errstate(divide='ignore'):
+            log_L0, log_A0, log_R0 = np.log(par.L0), np.log(par.A0), np.log(par.R0)
+            log_E0 = np.log(par.s_E) + log_R0
+            n, g, r = np.log1p(par.n), np.log1p(par.g), np.log1p(-par.s_E)
+        oil = np.asarray(epsilon) != 0      # The oil terms are left out when the oil share is 0 (where s_E may be 0)
+        with np.errstate(invalid='ignore'):
+            b = beta*(g + n) + np.where(oil, epsilon*r, 0)
+            log_B0 = beta*(log_A0 + log_L0) + kappa*np.log(par.X) + np.where(oil, epsilon*log_E0, 0)
+
+        # Capital-output ratio in period 0
+        z = np.exp((1-par.alpha)*np.log(par.K0) - log_B0)
+        converged = False
+
+        for start in range(0, T+1, block_size):
+            stop = min(start + block_size, T+1)
+            t = np.arange(start, stop)
+
+            # Capital-output ratio, iterated until it reaches its fixed point
+            Z = np.empty((stop-start, len(z)))
+            i = 0
+            while not converged and i < len(t):
+                Z[i] = z
+                z_next = (par.s_Y + (1-par.delta)*z)**(1-par.alpha) * z**par.alpha * np.exp(-b)
+                converged = np.array_equal(z_next, z)
+                z = z_next
+                i += 1
+            if converged:
+                Z[i:] = z
+            if self.stats is not None:
+                self.stats.count('simulate_blocks.iterations', i)
+
+            # Logs of the paths
+            log_L = log_L0 + t[:, None]*n
+            log_A = log_A0 + t[:, None]*g
+            log_R = log_R0 + t[:, None]*r
+            log_E = log_E0 + t[:, None]*r
+            log_B = log_B0 + t[:, None]*b
+            log_K = (np.log(Z) + log_B)/(1-par.alpha)
+            log_Y = log_K - np.log(Z)
+
+            yield SimpleNamespace(t=t, log_K=log_K.T, log_L=log_L.T, log_A=log_A.T, log_R=log_R.T, log_Y=log_Y.T, log_E=log_E.T,
+                                  z=Z.T, log_k=(log_K - log_A - log_L).T, log_y=(log_Y - log_A - log_L).T)
+
+
+    def simulate_to_disk(self, out_dir, periods = 10**6, ext1 = False, ext2 = False, names = ('z', 'log_K', 'log_Y'), block_size = 100000, **params):
+        """
+        Simulate the model over a long horizon (see simulate_blocks) and write the paths to memory-mapped .npy files
+
+        Args:
+            out_dir: Directory of the files, one file per path named after it
+            periods: Number of periods to simulate
+            ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
+            names: Paths to write (any of the paths yielded by simulate_blocks)
+            block_size: Number of periods written at a time
+            **params: Parameters to override, scalars or arrays of length P (see par_arrays)
+
+        Returns:
+            sim: Namespace with the memory-mapped paths, arrays of shape (P, periods+1)
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        P = len(self.par_arrays(**params).alpha)
+        sim = SimpleNamespace(**{name: np.lib.format.open_memmap(os.path.join(out_dir, f'{name}.npy'), mode='w+', dtype=float, shape=(P, periods+1)) for name in names})
+
+        for block in self.simulate_blocks(periods, ext1, ext2, block_size, **params):
+            for name in names:
+                getattr(sim, name)[:, block.t[0]:block.t[-1]+1] = getattr(block, name)
+
+        for name in names:
+            getattr(sim, name).flush()
+
+        return sim
+
+
+    def calibrate(self, Y, t = None, ext1 = False, ext2 = False, names = None, bounds = None, restarts = 8, population = 256,
+                  elite = 0.1, iterations = 60, tol = 1e-4, polish = True, seed = 2024, workers = None, do_print = False):
+        """
+        Calibrate the parameters to an observed output path
+
+        The distance is the mean squared difference between the simulated and observed log output, after removing
+        the mean difference (the level of output is not identified, only its path). It is minimized by a cross-entropy
+        search: every iteration draws a population of parameter sets around the current mean, evaluates them all in
+        one vectorized simulation, and moves the mean and spread to the best share (elite) of them. Several restarts
+        with different seeds run in parallel processes, and the best result is optionally polished with L-BFGS-B.
+        Parameters that are not calibrated keep their values in self.par, which is not changed. Technology and labor
+        only enter output through (1+g)*(1+n), so g and n are not identified separately from output alone.
+
+        Example, with the world GDP series of the data project:
+            gdp = load_gdp('../dataproject/GDP.xls')
+            result = model.calibrate(gdp.GDP, t=gdp.Year - gdp.Year.iloc[0], ext1=True)
+            model.par = model.par.replace(**result.params)
+
+        Args:
+            Y: Observed output, array or Series
+            t: Periods of the observations (0, 1, 2, ... if None), gaps are allowed
+            ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
+            names: Parameters to calibrate (s_Y, delta, g, n and the land and oil shares used by the extension if None)
+            bounds: Dictionary of (lower, upper) bounds overriding CALIBRATION_BOUNDS
+            restarts: Number of independent searches
+            population: Number of parameter sets drawn in each iteration
+            elite: Share of the population the distribution is refitted to
+            iterations: Maximum number of iterations of each search
+            tol: A search stops when the spread of every parameter is below tol times the width of its bounds
+            polish: If True, the best parameters are refined with L-BFGS-B
+            seed: Seed of the searches
+            workers: Number of processes (the number of cores if None, 1 runs the restarts in this process)
+            do_print: If True, the result is printed
+
+        Returns:
+            result: Namespace with the calibrated params (dictionary), the distance loss, the losses of the restarts,
+                the number of evaluations and the fitted log output path log_Y (with the observed level)
+        """
+        Y = np.asarray(Y, dtype=float)
+        t = np.arange(len(Y)) if t is None else np.asarray(t, dtype=int)
+        if names is None:
+            names = ['s_Y', 'delta', 'g', 'n'] + (['kappa'] if ext1 or ext2 else []) + (['epsilon'] if ext2 else [])
+        bounds = {**CALIBRATION_BOUNDS, **(bounds or {})}
+        lo = np.array([bounds[name][0] for name in names], dtype=float)
+        hi = np.array([bounds[name][1] for name in names], dtype=float)
+
+        # Only the finite, positive observations are used
+        keep = np.isfinite(Y) & (Y > 0)
+        problem = (self.par, np.log(Y[keep]), t[keep], ext1, ext2, tuple(names))
+
+        # 1. Cross-entropy searches, in parallel processes
+        seeds = np.random.SeedSequence(seed).spawn(restarts)
+        args = [(problem, lo, hi, s, population, elite, iterations, tol) for s in seeds]
+        with self._timer('calibrate'):
+            if workers == 1 or restarts == 1:
+                searches = [_cross_entropy_search(*a) for a in args]
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    searches = list(pool.map(_cross_entropy_search, *zip(*args)))
+
+            losses = np.array([search[1] for search in searches])
+            x = searches[int(np.argmin(losses))][0]
+            evaluations = sum(search[2] for search in searches)
+
+            # 2. Polish the best parameters
+            if polish:
+                def obj(x):
+                    return _calibration_loss(problem, x[None, :])[0]
+                res = optimize.minimize(obj, x, method='L-BFGS-B', bounds=list(zip(lo, hi)))
+                evaluations += res.nfev
+                if res.fun < losses.min():
+                    x = res.x
+
+        loss, log_Y = _calibration_loss(problem, x[None, :], return_path=True)
+        if self.stats is not None:
+            self.stats.count('calibrate.evaluations', evaluations)
+
+        result = SimpleNamespace(params=dict(zip(names, x.tolist())), loss=loss[0], losses=losses, evaluations=evaluations, t=t[keep], log_Y=log_Y[0])
+
+        # Print results
+        if do_print:
+            print(f'Calibrated parameters (root mean squared log distance {np.sqrt(result.loss):.4f}, {evaluations} evaluations):')
+            for name, value in result.params.items():
+                print(f'  {name} = {value:.4f}')
+
+        return result
+
+
+    def graph(self, periods = 100, ext1 = False, ext2 = False, do_print = False, shock_period = 0, shock_size = 0):
+        """
+        Graph the model
+
+        Args:
+            periods: Number of periods to simulate
+            ext: The extension of the model. 0 is the basic model, 1 is the model with land, and 2 is the model with land and oil.
+            do_print: If True, the solution is printed
+            shock_period: Period of shock (set to 0 as default)
+            shock_size: Amount of capital destroyed (set to 0 as default)
         
+        Returns:
+            if do_print is True, the solution is printed
+        """
+        par = self.par  # Parameters
+        sim = self.sim  # Simulation results
+        T = periods
+
+        with self._timer('graph'):
+            # Find steady state
+            ss = self.solve_ss(method='brentq', ext1=ext1, ext2=ext2).root
 
-        # Simulate remaining periods
-        for t in range(shock_period, T):
-            sim.K[t+1] = par.s_Y * sim.Y[t] + (1-par.delta)*sim.K[t]
-            sim.L[t+1] = (1+par.n)*sim.L[t]
-            sim.A[t+1] = (1+par.g)*sim.A[t]
-            sim.R[t+1] = (1-par.s_E)*sim.R[t]
-            sim.E[t+1] = par.s_E * sim.R[t+1]
-            sim.Y[t+1] = sim.K[t+1]**par.alpha * (sim.A[t+1]*sim.L[t+1])**(1-par.alpha-kappa-epsilon) * par.X**kappa * sim.E[t+1]**epsilon 
-            sim.z[t+1] = sim.K[t+1]/sim.Y[t+1]
+            if ss < 0:
+                message = 'The steady state is negative'
+            else:
+                message = ''
+
+            # Simulate the model and store the (single) path
+            result = self.simulate(periods=T, ext1=ext1, ext2=ext2, shock_period=shock_period, shock_size=shock_size)
+        for name in ['K', 'L', 'A', 'R', 'Y', 'E', 'z']:
+            setattr(sim, name, getattr(result, name)[0])
+        sim.t = np.linspace(0, T+1, T+1)    # Time
 
         # Plot
         if do_print == True:    # Start plotting
@@ -326,4 +1092,161 @@ class Solow:
             plt.show() # Show plot
 
 
+def summarize_paths(x, quantiles = (0.05, 0.5, 0.95), burn_in = None, chunk_size = 1000, period_chunk = None, max_bytes = 2**26):
+    """
+    Summarize simulated paths (e.g. from Solow.simulate_stochastic) without loading them into memory at once
+
+    The ergodic moments assume the paths are stationary after burn_in. The paths start away from the steady state,
+    so leaving out the transition matters: with burn_in = 0 the moments mix the transition with the stationary part.
+
+    Args:
+        x: Array of shape (paths, periods+1), possibly memory-mapped
+        quantiles: Quantiles of the bands
+        burn_in: Number of initial periods left out of the ergodic moments (the first half of the periods if None)
+        chunk_size: Number of paths read at a time for the ergodic moments
+        period_chunk: Number of periods read at a time for the mean path and the bands (sized so a block of all
+            paths takes about max_bytes if None)
+        max_bytes: Size of a block of periods when period_chunk is None
+
+    Returns:
+        summary: Namespace with the mean path, the quantile bands of shape (len(quantiles), periods+1) and the
+            ergodic mean, standard deviation and first-order autocorrelation pooled over paths and periods after burn_in
+    """
+    paths, T1 = x.shape
+    if burn_in is None:
+        burn_in = T1 // 2
+    if period_chunk is None:
+        period_chunk = max(1, max_bytes // (paths*x.dtype.itemsize))
+
+    # Mean path and quantile bands, computed a block of periods at a time
+    mean = np.empty(T1)
+    bands = np.empty((len(quantiles), T1))
+    for start in range(0, T1, period_chunk):
+        block = np.asarray(x[:, start:start+period_chunk])
+        mean[start:start+period_chunk] = block.mean(axis=0)
+        bands[:, start:start+period_chunk] = np.quantile(block, quantiles, axis=0)
+
+    # Ergodic moments from running sums, computed a block of paths at a time. The values are shifted by the
+    # first value after burn_in to limit the cancellation in the sums of squares.
+    shift = float(x[0, burn_in]) if burn_in < T1 else 0.0
+    n = s = ss = 0                                  # All values
+    n_lag = s_lead = s_lag = ss_lead = ss_lag = s_cross = 0     # Pairs of a value (lead) and the value before it (lag)
+    for start in range(0, paths, chunk_size):
+        block = np.asarray(x[start:start+chunk_size, burn_in:]) - shift
+        n += block.size
+        s += block.sum()
+        ss += (block**2).sum()
+
+        lead, lag = block[:, 1:], block[:, :-1]
+        n_lag += lead.size
+        s_lead += lead.sum()
+        s_lag += lag.sum()
+        ss_lead += (lead**2).sum()
+        ss_lag += (lag**2).sum()
+        s_cross += (lead*lag).sum()
+
+    ergodic_mean = s/n + shift if n > 0 else np.nan
+    ergodic_var = max(ss/n - (s/n)**2, 0) if n > 0 else np.nan
+
+    # Pearson correlation of the lagged pairs
+    if n_lag > 0:
+        var_lead = ss_lead/n_lag - (s_lead/n_lag)**2
+        var_lag = ss_lag/n_lag - (s_lag/n_lag)**2
+        cov = s_cross/n_lag - (s_lead/n_lag)*(s_lag/n_lag)
+        autocorr = cov/np.sqrt(var_lead*var_lag) if var_lead > 0 and var_lag > 0 else np.nan
+    else:
+        autocorr = np.nan
+
+    return SimpleNamespace(mean=mean, quantiles=np.asarray(quantiles), bands=bands, ergodic_mean=ergodic_mean, ergodic_std=np.sqrt(ergodic_var), autocorr=autocorr)
+
+
+
+# Bounds of the parameters in Solow.calibrate
+CALIBRATION_BOUNDS = {
+    's_Y': (0.01, 0.6),
+    'delta': (0.0, 0.2),
+    'g': (-0.02, 0.08),
+    'n': (-0.02, 0.05),
+    'kappa': (0.0, 0.4),
+    'epsilon': (0.0, 0.4),
+    's_E': (0.0, 0.1),
+    'alpha': (0.1, 0.6),
+}
+
+
+def _calibration_loss(problem, X, return_path = False):
+    """
+    Distance between simulated and observed log output for many parameter sets (see Solow.calibrate)
+
+    Args:
+        problem: Tuple of the parameters, the observed log output, its periods, the extension and the calibrated names
+        X: Calibrated parameters, array of shape (P, len(names))
+        return_path: If True, the fitted log output is returned as well
+
+    Returns:
+        loss: Mean squared distance after removing the mean difference, inf for invalid parameter sets
+        log_Y: Fitted log output at the observed periods, shifted to the observed level (if return_path)
+    """
+    par, log_Y_obs, t, ext1, ext2, names = problem
+    model = Solow()
+    model.par = par
+    params = dict(zip(names, X.T))
+
+    sim = model.simulate(periods=int(t.max()), ext1=ext1, ext2=ext2, **params)
+    with np.errstate(all='ignore'):
+        diff = np.log(sim.Y[:, t]) - log_Y_obs
+    level = diff.mean(axis=1, keepdims=True)
+    loss = np.mean((diff - level)**2, axis=1)
+
+    # Shares must leave a positive share to labor and technology
+    par = model.par_arrays(**params)
+    kappa, epsilon = _shares(par, ext1, ext2)
+    loss[~np.isfinite(loss) | (par.alpha + kappa + epsilon >= 1)] = np.inf
+
+    if return_path:
+        return loss, np.log(sim.Y[:, t]) - level
+    return loss
+
+
+def _cross_entropy_search(problem, lo, hi, seed, population = 256, elite = 0.1, iterations = 60, tol = 1e-4):
+    """
+    One cross-entropy search for Solow.calibrate (at module level, so it can run in another process)
+
+    Args:
+        problem: See _calibration_loss
+        lo, hi: Bounds of the calibrated parameters
+        seed: Seed (or SeedSequence) of the search
+        population: Number of parameter sets drawn in each iteration
+        elite: Share of the population the distribution is refitted to
+        iterations: Maximum number of iterations
+        tol: Stop when the spread of every parameter is below tol times the width of its bounds
+
+    Returns:
+        x: Best parameters found
+        loss: Their distance
+        evaluations: Number of parameter sets evaluated
+    """
+    rng = np.random.default_rng(seed)
+    n_elite = max(2, int(elite*population))
+
+    mean = rng.uniform(lo, hi)
+    std = (hi - lo)/2
+    best_x, best_loss = mean, np.inf
+    evaluations = 0
+
+    for _ in range(iterations):
+        X = np.clip(mean + std*rng.standard_normal((population, len(lo))), lo, hi)
+        loss = _calibration_loss(problem, X)
+        evaluations += population
+
+        order = np.argsort(loss)[:n_elite]
+        if loss[order[0]] < best_loss:
+            best_x, best_loss = X[order[0]], loss[order[0]]
+
+        # Refit the distribution to the elite, smoothing the spread so it does not collapse too early
+        mean = X[order].mean(axis=0)
+        std = 0.7*X[order].std(axis=0) + 0.3*std
+        if np.all(std < tol*(hi - lo)):
+            break
 
+    return best_x, best_loss, evaluations